@@ -0,0 +1,19 @@
+"""
+ASGI config for HMS project.
+
+It exposes the ASGI callable as a module-level variable named ``application``, e.g.
+``gunicorn HMS.asgi:application -k uvicorn.workers.UvicornWorker`` or ``uvicorn HMS.asgi:application``.
+Django 1.11 itself is synchronous, see hotel/asynchronous.py for what runs asynchronously.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "HMS.settings")
+
+wsgi_application = get_wsgi_application()
+
+from hotel.asynchronous import HotelASGIApplication  # noqa: E402 (needs django.setup() from above)
+
+application = HotelASGIApplication(wsgi_application)
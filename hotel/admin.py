@@ -1,7 +1,47 @@
+from django import forms
 from django.contrib import admin
-from .models import Room, Booking
+from .models import Room, Booking, RoomRate, SeasonalRate
+from .locking import lock_rooms_for_update
+from .validations import check_availability, CustomException
+
+
+class BookingAdminForm(forms.ModelForm):
+    class Meta:
+        model = Booking
+        fields = '__all__'
+
+    def clean(self):
+        # the same check as of BookingSerializer, otherwise the unique (room, date) of RoomNight refuses an
+        # overlapping booking with an IntegrityError
+        cleaned_data = super().clean()
+        rooms, check_in, check_out = (cleaned_data.get(x) for x in ('rooms', 'check_in', 'check_out'))
+        if rooms and check_in and check_out:
+            if check_in >= check_out:
+                raise forms.ValidationError({'check_out': '"Check in" date should precede "Check out"'})
+            try:
+                check_availability(rooms, check_in, check_out,
+                                   booking_to_exclude=self.instance if self.instance.pk else None)
+            except CustomException as error:
+                raise forms.ValidationError({'rooms': error.detail})
+        return cleaned_data
+
+
+class BookingAdmin(admin.ModelAdmin):
+    form = BookingAdminForm
+
+    def save_model(self, request, obj, form, change):
+        # runs in the transaction of the admin view, see BookingSerializer.lock_rooms() and update()
+        rooms = {room.number for room in form.cleaned_data['rooms']}
+        if change:
+            rooms.update(obj.rooms.values_list('number', flat=True))
+        lock_rooms_for_update(rooms)
+        if change and {'check_in', 'check_out'} & set(form.changed_data):
+            obj.rooms.clear()  # nights are created once for the final rooms and dates by save_related()
+        super().save_model(request, obj, form, change)
+
 
 # Register your models here.
 admin.site.register(Room)
-admin.site.register(Booking)
-
+admin.site.register(Booking, BookingAdmin)
+admin.site.register(RoomRate)
+admin.site.register(SeasonalRate)
@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import QueryDict
+from rest_framework.renderers import JSONRenderer
+from .availability import available_rooms
+from .serializers import RoomSerializer, AvailabilitySerializer
+
+# ASGI entry point (HMS/asgi.py) - Django 1.11 has neither async views nor an ASGI handler, so:
+# - every request still goes through the WSGI stack, but in a bounded pool of threads, so one process serves
+#   HOTEL_ASGI_THREADS requests at once while the event loop keeps accepting connections (asgiref's WsgiToAsgi
+#   would run them all in a single thread)
+# - anonymous JSON availability lookups (the booking widget) are answered natively: the event loop only waits
+#   for the query running in the same pool, without middleware, authentication and content negotiation
+
+executor = ThreadPoolExecutor(max_workers=getattr(settings, 'HOTEL_ASGI_THREADS', 16),
+                              thread_name_prefix='hotel-asgi')
+
+
+def database_sync_to_async(function):
+    """Like sync_to_async(), in the pool of the ASGI application, with Django's per-request connection cleanup."""
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return wraps(function)(sync_to_async(run, thread_sensitive=False, executor=executor))
+
+
+@database_sync_to_async
+def get_available_rooms(query_string):
+    """Returns (status code, data) of GET /api/availability/ (AvailabilityViewSet) for a query string."""
+    params = AvailabilitySerializer(data=QueryDict(query_string))
+    if not params.is_valid():
+        return 400, params.errors
+    params = params.validated_data
+    rooms = available_rooms(params['check_in'], params['check_out'], params.get('category'))
+    return 200, RoomSerializer(rooms, many=True).data
+
+
+def is_availability_lookup(scope):
+    headers = dict(scope.get('headers', []))
+    query = QueryDict(scope.get('query_string', b''))
+    return (scope['method'] == 'GET' and scope['path'] == '/api/availability/'
+            and b'authorization' not in headers  # wrong credentials are rejected by the API, not ignored
+            and (query.get('format') == 'json' or b'text/html' not in headers.get(b'accept', b'')))
+
+
+async def send_json(send, status, data):
+    body = JSONRenderer().render(data)
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+                            (b'allow', b'GET, HEAD, OPTIONS'), (b'vary', b'Accept')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class ThreadPoolWsgiInstance(WsgiToAsgiInstance):
+    @sync_to_async(thread_sensitive=False, executor=executor)
+    def run_wsgi_app(self, body):
+        # unlike asgiref's version the response is closed, which sends request_finished (closes old connections)
+        response = self.wsgi_application(self.build_environ(self.scope, body), self.start_response)
+        try:
+            for output in response:
+                if not self.response_started:
+                    self.response_started = True
+                    self.sync_send(self.response_start)
+                self.sync_send({'type': 'http.response.body', 'body': output, 'more_body': True})
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({'type': 'http.response.body'})
+
+
+class HotelASGIApplication:
+    def __init__(self, wsgi_application):
+        self.wsgi_application = wsgi_application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and is_availability_lookup(scope):
+            status, data = await get_available_rooms(scope.get('query_string', b'').decode('latin1'))
+            return await send_json(send, status, data)
+        await ThreadPoolWsgiInstance(self.wsgi_application)(scope, receive, send)
+
+    @staticmethod
+    async def lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,56 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+# API clients log in once (AuthViewSet.login) and send "Authorization: Token <key>" afterwards - unlike Basic
+# authentication no password is hashed per request, and the token's user comes from the cache instead of a query.
+# Cached entries are removed by signals when the token is deleted (logout, expiry) or its user changes.
+
+TOKEN_CACHE_KEY = 'hotel:token:{}'
+TOKEN_CACHE_TIMEOUT = 60 * 5  # see TABLE_VERSION_CACHE_TIMEOUT in caching.py
+
+
+def get_token_ttl():
+    return timedelta(seconds=getattr(settings, 'HOTEL_TOKEN_TTL', 60 * 60 * 24 * 7))
+
+
+def token_expires(token):
+    return token.created + get_token_ttl()
+
+
+def issue_token(user):
+    """Returns a valid token of the user, an expired one is replaced by a new one."""
+    token, created = Token.objects.get_or_create(user=user)
+    if not created and token_expires(token) <= timezone.now():
+        token.delete()
+        token = Token.objects.create(user=user)
+    return token
+
+
+def forget_tokens(keys):
+    cache.delete_many([TOKEN_CACHE_KEY.format(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication with expiry (HOTEL_TOKEN_TTL seconds since the token was issued) and the token-to-user
+    lookup cached for TOKEN_CACHE_TIMEOUT.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = cache.get(TOKEN_CACHE_KEY.format(key))
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            cached = (user, token)
+            timeout = min(TOKEN_CACHE_TIMEOUT, (token_expires(token) - timezone.now()).total_seconds())
+            if timeout > 0:
+                cache.set(TOKEN_CACHE_KEY.format(key), cached, timeout)
+        user, token = cached
+        if token_expires(token) <= timezone.now():
+            token.delete()
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        return user, token
@@ -0,0 +1,85 @@
+import time
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import connection
+from .caching import get_table_versions
+from .models import Room, RoomOccupancy
+from .occupancy import from_bytes, night_index
+
+# optional (HOTEL_AVAILABILITY_CACHE) copy of the calendar bitmaps (RoomOccupancy, one bit per booked night, about
+# 23 kB per 500 rooms and year) and room categories in memory of the worker, so availability checks and searches
+# are answered without a query. The copy belongs to the versions of the booking and room tables (caching.py,
+# bumped by signals.py) - with a shared cache backend every worker drops it right after a change, with locmem
+# other workers only after SNAPSHOT_TIMEOUT. Bookings are still checked against the database while holding the
+# room locks (serializers.py, bulk.py), so a stale copy can only make a check or a search answer wrongly, never
+# let two bookings overlap.
+
+SNAPSHOT_TIMEOUT = 30  # seconds
+
+_snapshot = None
+
+
+class AvailabilitySnapshot:
+    def __init__(self, versions):
+        self.versions = versions
+        self.created = time.monotonic()
+        self.categories = dict(Room.objects.values_list('number', 'category'))
+        self.years = {}  # {year: {room: bitmap}}, loaded when first needed
+
+    def is_current(self, versions):
+        return versions == self.versions and time.monotonic() - self.created < SNAPSHOT_TIMEOUT
+
+    def get_year(self, year):
+        bitmaps = self.years.get(year)
+        if bitmaps is None:  # parallel threads may both load it, the result is the same
+            bitmaps = self.years[year] = {room: from_bytes(nights) for room, nights in
+                                          RoomOccupancy.objects.filter(year=year).values_list('room', 'nights')}
+        return bitmaps
+
+    def blocked_rooms(self, check_in, check_out):
+        """
+        Rooms with a booked night from the day before check_in to check_out - the same edge days are treated as
+        overlapping (see models.RoomNightQuerySet.blocking).
+        """
+        first, last = check_in - timedelta(days=1), check_out
+        blocked = set()
+        for year in range(first.year, last.year + 1):
+            start = night_index(max(first, date(year, 1, 1)))
+            end = night_index(min(last, date(year, 12, 31)))
+            mask = ((1 << (end - start + 1)) - 1) << start
+            blocked.update(room for room, bitmap in self.get_year(year).items() if bitmap & mask)
+        return blocked
+
+
+def is_enabled():
+    # inside a transaction the copy could be built from rows which are rolled back later
+    return getattr(settings, 'HOTEL_AVAILABILITY_CACHE', False) and not connection.in_atomic_block
+
+
+def get_snapshot():
+    global _snapshot
+    versions = get_table_versions(['booking', 'room'])
+    snapshot = _snapshot
+    if snapshot is None or not snapshot.is_current(versions):
+        snapshot = _snapshot = AvailabilitySnapshot(versions)
+    return snapshot
+
+
+def are_rooms_available(rooms, check_in, check_out):
+    """Takes rooms (or their numbers), answers from the snapshot. Use is_enabled() first."""
+    numbers = {getattr(room, 'pk', room) for room in rooms}
+    return not numbers & get_snapshot().blocked_rooms(check_in, check_out)
+
+
+def available_rooms(check_in, check_out, category=None):
+    """
+    Rooms without any blocking night ordered by number - unsaved Room instances from the snapshot when the cache
+    is enabled, a queryset otherwise.
+    """
+    if not is_enabled():
+        return Room.objects.available_between(check_in, check_out, category).order_by('number')
+    snapshot = get_snapshot()
+    blocked = snapshot.blocked_rooms(check_in, check_out)
+    return [Room(number=number, category=room_category)
+            for number, room_category in sorted(snapshot.categories.items())
+            if number not in blocked and (category is None or room_category == category)]
@@ -0,0 +1,189 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, time as day_time, timedelta
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User, Group
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from .caching import bump_table_versions
+from .models import Room, Booking, RoomReservation
+from .occupancy import rebuild_occupancy, rebuild_room_nights
+
+SURNAMES = ['Nowak', 'Kowalski', 'Wisniewski', 'Wojcik', 'Kowalczyk', 'Kaminski', 'Lewandowski', 'Zielinski',
+            'Szymanski', 'Wozniak', 'Dabrowski', 'Kozlowski', 'Jankowski', 'Mazur', 'Kwiatkowski', 'Krawczyk']
+
+
+@contextmanager
+def throwaway_database():
+    """
+    Runs the block on a freshly migrated test database, destroyed afterwards. SQLite gets a real file instead of
+    the in-memory test database, which has neither WAL nor the locking of a deployment.
+    """
+    old_name = connection.settings_dict['NAME']
+    old_test_name = connection.settings_dict['TEST'].get('NAME')
+    directory = None
+    if connection.vendor == 'sqlite':
+        directory = tempfile.mkdtemp()
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        connection.settings_dict['TEST']['NAME'] = old_test_name
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)  # with the -wal and -shm files
+
+
+def seed_bookings(rooms=400, users=50, bookings=10000, first_day=date(2010, 1, 1), batch_size=5000, random_seed=0):
+    """Fills an empty database with rooms, Client users and non-overlapping single-room bookings.
+
+    Bookings are laid out per room one after another (with a random gap), so the history grows into the past the
+    same way a real hotel's does. Rows are inserted with explicit ids in batches (bulk_create returns no ids on
+    SQLite), afterwards the id sequence is moved past them, so later inserts do not reuse the ids on PostgreSQL.
+    Returns the day after the last seeded check-out.
+    """
+    rng = random.Random(random_seed)
+    group_client, _ = Group.objects.get_or_create(name='Client')
+    Group.objects.get_or_create(name='Staff')
+    password = make_password('password')
+    User.objects.bulk_create([User(username=f'bench{i}', password=password) for i in range(users)])
+    user_ids = list(User.objects.filter(username__startswith='bench').values_list('id', flat=True))
+    group_client.user_set.add(*user_ids)
+    Room.objects.bulk_create([Room(number=number, category=number % 4 + 1) for number in range(1, rooms + 1)])
+    room_ids = list(Room.objects.order_by('number').values_list('number', flat=True))
+    next_free = {room_id: first_day for room_id in room_ids}
+    through = Booking.rooms.through
+    last_day = first_day
+    start_id = (Booking.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+    for batch_start in range(0, bookings, batch_size):
+        booking_rows, through_rows, reservation_rows = [], [], []
+        for booking_id in range(start_id + batch_start, start_id + min(batch_start + batch_size, bookings)):
+            room_id = room_ids[booking_id % len(room_ids)]
+            check_in = next_free[room_id] + timedelta(days=rng.randint(0, 3))
+            check_out = check_in + timedelta(days=rng.randint(1, 6))
+            next_free[room_id] = check_out + timedelta(days=1)
+            last_day = max(last_day, check_out)
+            created = datetime.combine(check_in - timedelta(days=rng.randint(0, 60)),
+                                       day_time(rng.randint(0, 23), tzinfo=timezone.utc))
+            booking_rows.append(Booking(id=booking_id, user_id=rng.choice(user_ids), surname=rng.choice(SURNAMES),
+                                        check_in=check_in, check_out=check_out, created=created))
+            through_rows.append(through(booking_id=booking_id, room_id=room_id))
+            reservation_rows.append(RoomReservation(booking_id=booking_id, room_id=room_id,
+                                                    check_in=check_in, check_out=check_out))
+        with transaction.atomic():
+            Booking.objects.bulk_create(booking_rows)
+            through.objects.bulk_create(through_rows)
+            RoomReservation.objects.bulk_create(reservation_rows)
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Booking]):
+            cursor.execute(sql)
+    rebuild_room_nights()
+    rebuild_occupancy()
+    return last_day + timedelta(days=1)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def latency_summary(samples):
+    return {'p50': round(percentile(samples, 0.5), 3), 'p95': round(percentile(samples, 0.95), 3),
+            'p99': round(percentile(samples, 0.99), 3), 'max': round(max(samples), 3)}
+
+
+def measure(function, repeat=20):
+    """Calls function repeat times and returns latency percentiles in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    return latency_summary(samples)
+
+
+def measure_requests(send, repeat=20):
+    """
+    Calls send(n) for n in range(repeat), every call makes one request with the test client and returns the response.
+    Returns latency percentiles in milliseconds, numbers of SQL queries and counts of response status codes.
+    """
+    samples, queries, statuses = [], [], Counter()
+    for n in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = send(n)
+            samples.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        statuses[str(response.status_code)] += 1
+    return dict(latency_summary(samples), queries_min=min(queries), queries_max=max(queries), statuses=statuses)
+
+
+def benchmark_api(end, repeat=20):
+    """
+    Measures the booking API and the HTML booking pages on a database filled by seed_bookings(), `end` is the date
+    it returned (new bookings are posted after it, so none of them is rejected as unavailable).
+    Requests go through the whole stack (middleware, authentication, rendering) like in a deployment.
+    """
+    group_staff, _ = Group.objects.get_or_create(name='Staff')
+    user, created = User.objects.get_or_create(username='bench-staff')
+    if created:
+        user.set_password('password')
+        user.save()
+        group_staff.user_set.add(user)
+    token = Client().post('/api/auth/login/', {'username': 'bench-staff', 'password': 'password'}).json()['token']
+    client = Client(HTTP_AUTHORIZATION='Token ' + token)
+    rooms = list(Room.objects.order_by('number').values_list('number', flat=True))
+    some_day = (end - timedelta(days=30)).isoformat()
+
+    first_free = max(end, date.today() + timedelta(days=1))  # small seeds end in the past
+
+    def post_booking(n):
+        check_in = first_free + timedelta(days=n // len(rooms) * 3)
+        return client.post('/api/bookings/', {'surname': 'Bench', 'rooms': [rooms[n % len(rooms)]],
+                                              'check_in': check_in, 'check_out': check_in + timedelta(days=2)})
+
+    def uncached(path, params=None):
+        def send(n):
+            bump_table_versions('booking')  # response cache (caching.py) would answer everything but the first one
+            return client.get(path, params)
+        return send
+
+    scenarios = {
+        'api_bookings': uncached('/api/bookings/'),
+        'api_bookings_cached': lambda n: client.get('/api/bookings/'),
+        'api_search_surname': lambda n: client.get('/api/search/', {'surname': SURNAMES[n % len(SURNAMES)]}),
+        'api_search_rooms': lambda n: client.get('/api/search/', {'rooms': f'{rooms[n % len(rooms)]},{rooms[0]}'}),
+        'api_search_active': lambda n: client.get('/api/search/', {'active_from': some_day, 'active_to': some_day}),
+        'api_search_price': lambda n: client.get('/api/search/', {'ordering': '-price', 'price_min': 500}),
+        'api_booking_post': post_booking,
+        'html_bookings': lambda n: client.get('/bookings/'),
+        'html_search': lambda n: client.get('/search/', {'surname': SURNAMES[n % len(SURNAMES)]}),
+    }
+    return {name: measure_requests(send, repeat) for name, send in scenarios.items()}
+
+
+async def asgi_get(application, path, query_string='', headers=()):
+    """Sends one GET request to an ASGI application in process, returns (status code, body)."""
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+             'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': query_string.encode(),
+             'headers': [(b'host', b'testserver')] + list(headers), 'server': ('testserver', 80),
+             'client': ('127.0.0.1', 50000)}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    return messages[0]['status'], b''.join(message.get('body', b'') for message in messages[1:])
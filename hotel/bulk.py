@@ -0,0 +1,120 @@
+from collections import defaultdict
+from django.db import transaction, connection
+from .models import Room, Booking, RoomReservation, RoomNight
+from .serializers import BulkRoomSerializer, BulkBookingSerializer
+from .validations import find_overlaps
+from .caching import bump_table_versions
+from .locking import lock_rooms_for_update, retry_on_locked
+from .occupancy import refresh_occupancy, stay_nights
+
+# batch imports (group reservations, tour operators) - every item is validated, availability of all bookings is
+# checked with one set-based query and everything is inserted with bulk_create() in one transaction
+# all or nothing: if any item is invalid nothing is saved, results say what is wrong with which item
+
+MAX_BATCH_SIZE = 500
+
+
+def validate_batch(serializer_class, items):
+    """
+    Returns (validated items, results) - results contain errors for invalid items and None for valid ones.
+    """
+    if not isinstance(items, list) or not 0 < len(items) <= MAX_BATCH_SIZE:
+        raise ValueError(f'Expected a list of 1 to {MAX_BATCH_SIZE} items')
+    validated, results = [], []
+    for item in items:
+        serializer = serializer_class(data=item)
+        valid = serializer.is_valid()
+        validated.append(serializer.validated_data if valid else None)
+        results.append(None if valid else serializer.errors)
+    return validated, results
+
+
+def import_rooms(items):
+    """
+    Returns (created, results), results are per item in the order of items.
+    """
+    validated, results = validate_batch(BulkRoomSerializer, items)
+    numbers = [item['number'] for item in validated if item is not None]
+    existing = set(Room.objects.filter(number__in=numbers).values_list('number', flat=True))
+    seen = set()
+    for index, item in enumerate(validated):
+        if item is None:
+            continue
+        if item['number'] in existing or item['number'] in seen:
+            results[index] = {'number': ['room with this number already exists.']}
+        seen.add(item['number'])
+    if any(results):
+        return False, [{'index': index, 'errors': errors} for index, errors in enumerate(results) if errors]
+    with transaction.atomic():
+        rooms = Room.objects.bulk_create([Room(**item) for item in validated])
+        bump_table_versions('room')  # bulk_create() does not send post_save
+    return True, [{'index': index, 'number': room.number, 'category': room.category}
+                  for index, room in enumerate(rooms)]
+
+
+def find_unavailable(items):
+    """
+    Takes validated booking items and returns indexes of the ones overlapping an existing reservation or an earlier
+    item of the same batch, with a single query for all of them.
+    """
+    rooms = {room for item in items for room in item['rooms']}
+    existing = RoomReservation.objects.filter(room__in=rooms).overlapping(
+        min(item['check_in'] for item in items), max(item['check_out'] for item in items),
+    ).values_list('room', 'check_in', 'check_out')
+    taken = defaultdict(list)
+    for room, check_in, check_out in existing:
+        taken[room].append((room, check_in, check_out))
+    unavailable = []
+    for index, item in enumerate(items):
+        wanted = [(room, item['check_in'], item['check_out']) for room in item['rooms']]
+        if any(find_overlaps(taken[reservation[0]] + [reservation]) for reservation in wanted):
+            unavailable.append(index)
+        else:
+            for reservation in wanted:
+                taken[reservation[0]].append(reservation)
+    return unavailable
+
+
+def import_bookings(items, user):
+    """
+    Returns (created, results), results are per item in the order of items.
+    """
+    validated, results = validate_batch(BulkBookingSerializer, items)
+    numbers = {room for item in validated if item is not None for room in item['rooms']}
+    existing_rooms = set(Room.objects.filter(number__in=numbers).values_list('number', flat=True))
+    for index, item in enumerate(validated):
+        if item is not None and not existing_rooms.issuperset(item['rooms']):
+            missing = sorted(set(item['rooms']) - existing_rooms)
+            results[index] = {'rooms': [f'Invalid pk "{room}" - object does not exist.' for room in missing]}
+    if any(results):
+        return False, [{'index': index, 'errors': errors} for index, errors in enumerate(results) if errors]
+
+    def save():  # retried as a whole when the database is locked
+        with transaction.atomic():
+            # the same locking as BookingSerializer.lock_rooms(), availability is checked while holding the locks
+            lock_rooms_for_update(numbers)
+            unavailable = find_unavailable(validated)
+            if unavailable:
+                return False, [{'index': index, 'errors': {'rooms': 'At least one of selected rooms is booked'}}
+                               for index in unavailable]
+            bookings = [Booking(user=user, surname=item['surname'], check_in=item['check_in'],
+                                check_out=item['check_out']) for item in validated]
+            if connection.features.can_return_ids_from_bulk_insert:
+                Booking.objects.bulk_create(bookings)
+            else:  # e.g. SQLite - ids are needed for the rooms, so bookings are inserted one by one (same transaction)
+                for booking in bookings:
+                    booking.save()
+            # bulk_create() does not send m2m_changed, so reservations, nights and bitmaps are created here instead
+            Booking.rooms.through.objects.bulk_create([
+                Booking.rooms.through(booking_id=booking.id, room_id=room)
+                for booking, item in zip(bookings, validated) for room in item['rooms']])
+            reservations = [RoomReservation(booking_id=booking.id, room_id=room, check_in=booking.check_in,
+                                            check_out=booking.check_out)
+                            for booking, item in zip(bookings, validated) for room in item['rooms']]
+            RoomReservation.objects.bulk_create(reservations)
+            RoomNight.objects.bulk_create([night for x in reservations
+                                           for night in stay_nights(x.booking_id, x.room_id, x.check_in, x.check_out)])
+            refresh_occupancy([(x.room_id, x.check_in, x.check_out) for x in reservations])
+            bump_table_versions('booking')
+        return True, [{'index': index, 'id': booking.id} for index, booking in enumerate(bookings)]
+    return retry_on_locked(save)
@@ -0,0 +1,82 @@
+import hashlib
+from uuid import uuid4
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+# read-only responses are cached under a key made of the versions of the tables they were built from,
+# signals (see signals.py) replace a version whenever its table changes, so an old entry is never read again
+# and simply expires. The same key is sent as ETag, so an unchanged response costs no query at all.
+
+TABLE_VERSION_CACHE_KEY = 'hotel:version:{}'
+# Every cache entry of the app (table versions here, tokens in authentication.py, user groups in permissions.py,
+# rates in pricing.py) is dropped or replaced by signals when its data changes. With a shared cache backend
+# (memcached, redis) all workers see that at once. With the default locmem backend every worker has its own cache
+# and sees only its own changes, so the entries also expire - the timeout is the longest time another worker
+# serves stale data, traded against one more query per worker after every expiry.
+TABLE_VERSION_CACHE_TIMEOUT = 60
+RESPONSE_CACHE_KEY = 'hotel:response:{}'
+RESPONSE_CACHE_TIMEOUT = 60 * 5
+
+
+def get_table_versions(tables):
+    keys = [TABLE_VERSION_CACHE_KEY.format(table) for table in tables]
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, TABLE_VERSION_CACHE_TIMEOUT)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_table_versions(*tables):
+    """
+    Makes cached responses built from tables stale. Done right away (readers in this transaction) and once more
+    after commit, because a concurrent request could cache the old rows under the new version in the meantime.
+    """
+    def bump():
+        cache.set_many({TABLE_VERSION_CACHE_KEY.format(table): uuid4().hex for table in tables},
+                       TABLE_VERSION_CACHE_TIMEOUT)
+    bump()
+    transaction.on_commit(bump)
+
+
+def response_etag(request, tables, per_user=False):
+    parts = get_table_versions(tables) + [request.get_full_path(), request.accepted_renderer.format]
+    if per_user:
+        parts.append(str(request.user.pk))
+    return quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+
+
+class CachedResponseMixin:
+    """
+    Caches serialized data of list and retrieve actions of a viewset, and answers If-None-Match with 304.
+    `cache_tables` are names of table versions the response depends on, `cache_per_user` keeps separate
+    entries for every user. Permissions are checked before, so cached data is never shown to anyone who
+    could not get it otherwise.
+    """
+    cache_tables = ()
+    cache_per_user = False
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, view, request, *args, **kwargs):
+        etag = response_etag(request, self.cache_tables, per_user=self.cache_per_user)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        data = cache.get(RESPONSE_CACHE_KEY.format(etag))
+        if data is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(RESPONSE_CACHE_KEY.format(etag), response.data, RESPONSE_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
@@ -4,6 +4,9 @@ ROOM_CATEGORIES = ((1, 'A'),
                    (3, 'C'),
                    (4, 'D'))
 
+CATEGORY_NAMES = dict(ROOM_CATEGORIES)
+
+# default base prices of a night, RoomRate rows (see pricing.get_room_rates) take precedence
 ROOM_PRICES = {'A': 200,
                'B': 150,
                'C': 100,
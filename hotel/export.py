@@ -0,0 +1,69 @@
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from .models import Booking
+from .pagination import following_rows
+
+# streaming exports of bookings - rows are read in chunks of the queryset's ordering, each chunk starting after
+# the last row of the previous one (like KeysetCursorPagination), and written as they come, rooms are fetched
+# with one query per chunk, so memory use does not depend on the number of exported bookings on any database
+# (.iterator() would read the whole result at once on SQLite, which has no chunked reads in Django 1.11)
+
+EXPORT_FIELDS = ['id', 'user', 'surname', 'rooms', 'check_in', 'check_out', 'created', 'nights', 'price']
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+CHUNK_SIZE = 2000
+
+
+def export_rows(queryset):
+    """
+    Takes a queryset annotated with nights and price (BookingQuerySet.with_price()) and yields dicts
+    with EXPORT_FIELDS.
+    """
+    ordering = list(queryset.query.order_by)
+    if not {'id', '-id', 'pk', '-pk'} & set(ordering):
+        ordering.append('id')  # positions have to be unique
+    fields = [order.lstrip('-') for order in ordering]
+    rows = queryset.values('id', 'user', 'surname', 'check_in', 'check_out', 'created', 'nights', 'price') \
+        .order_by(*ordering)
+    chunk = list(rows[:CHUNK_SIZE])
+    while chunk:
+        last = chunk[-1]
+        yield from with_rooms(chunk)
+        chunk = list(rows.filter(following_rows(ordering, [last[field] for field in fields]))[:CHUNK_SIZE])
+
+
+def with_rooms(chunk):
+    rooms = {}
+    links = Booking.rooms.through.objects.filter(booking_id__in=[row['id'] for row in chunk])
+    for booking_id, room_id in links.order_by('room_id').values_list('booking_id', 'room_id'):
+        rooms.setdefault(booking_id, []).append(room_id)
+    for row in chunk:
+        row['rooms'] = rooms.get(row['id'], [])
+        yield row
+
+
+class Echo:
+    # csv.writer writes into a file-like object, this one just returns the line to the generator
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        row['rooms'] = ' '.join(str(room) for room in row['rooms'])
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps({field: row[field] for field in EXPORT_FIELDS}, cls=DjangoJSONEncoder) + '\n'
+
+
+def export_response(queryset, output, filename='bookings'):
+    lines = csv_lines(export_rows(queryset)) if output == 'csv' else ndjson_lines(export_rows(queryset))
+    response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{output}"'
+    return response
@@ -0,0 +1,43 @@
+import random
+import time
+from django.db import connection, OperationalError
+from django.db.models import F
+from .models import Room
+
+# write serialization of bookings - availability is checked and the booking is saved while holding a write lock
+# of its rooms, so parallel requests for the same rooms run one after another (serializers.py, bulk.py)
+
+LOCKED_RETRY_ATTEMPTS = 5
+LOCKED_RETRY_DELAY = 0.05  # seconds, doubled after every attempt, plus jitter
+
+
+def lock_rooms_for_update(numbers):
+    """
+    Takes room numbers and locks their rows until the end of the current transaction, always in the same order
+    to avoid deadlocks. SQLite ignores SELECT ... FOR UPDATE, a no-op UPDATE takes its database write lock
+    instead - at the start of the transaction, so waiting for it is covered by busy_timeout (see sqlite.py).
+    """
+    numbers = sorted(numbers)
+    if connection.vendor == 'sqlite':
+        Room.objects.filter(number__in=numbers).update(category=F('category'))
+    else:
+        list(Room.objects.select_for_update().filter(number__in=numbers).order_by('number'))
+
+
+def is_locked_error(error):
+    # SQLite: "database is locked" (busy_timeout ran out), "database table is locked" (shared cache)
+    return isinstance(error, OperationalError) and 'locked' in str(error)
+
+
+def retry_on_locked(function):
+    """
+    Calls function (which should run its own transaction) again when the database was locked, with exponential
+    backoff. Inside an outer transaction nothing is retried, the whole outer transaction is broken anyway.
+    """
+    for attempt in range(LOCKED_RETRY_ATTEMPTS):
+        try:
+            return function()
+        except OperationalError as error:
+            if not is_locked_error(error) or connection.in_atomic_block or attempt == LOCKED_RETRY_ATTEMPTS - 1:
+                raise
+        time.sleep(LOCKED_RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
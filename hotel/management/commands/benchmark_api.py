@@ -0,0 +1,41 @@
+import json
+import platform
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from hotel.benchmark import throwaway_database, seed_bookings, benchmark_api
+
+
+class Command(BaseCommand):
+    help = 'Seeds a throwaway test database and reports latency percentiles and query counts of the booking API ' \
+           'and HTML pages as JSON, to be compared between releases'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=400)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--bookings', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='file for the JSON report, standard output by default')
+
+    def handle(self, *args, **options):
+        with throwaway_database():  # requests authenticate with a token (authentication.py)
+            end = seed_bookings(rooms=options['rooms'], users=options['users'], bookings=options['bookings'],
+                                random_seed=options['seed'])
+            endpoints = benchmark_api(end, repeat=options['repeat'])
+        report = {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                **{key: options[key] for key in ('rooms', 'users', 'bookings', 'repeat', 'seed')},
+            },
+            'endpoints': endpoints,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.test.client import RequestFactory
+from hotel.asynchronous import HotelASGIApplication
+from hotel.benchmark import throwaway_database, seed_bookings, latency_summary, asgi_get
+
+
+class Command(BaseCommand):
+    help = 'Compares throughput of availability lookups and room lists served by WSGI sync workers and by one ' \
+           'ASGI process, in process on a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=100)
+        parser.add_argument('--bookings', type=int, default=20000)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--wsgi-workers', type=int, default=3, help='gunicorn sync workers, one request each')
+        parser.add_argument('--concurrency', type=int, default=50, help='clients waiting on the ASGI process')
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            end = seed_bookings(rooms=options['rooms'], bookings=options['bookings'])
+            first_day = max(end, date.today()) - timedelta(days=30)
+            query_strings = [f'check_in={first_day + timedelta(days=n % 60)}&'
+                             f'check_out={first_day + timedelta(days=n % 60 + 3)}' for n in range(options['requests'])]
+            # availability is answered natively by the ASGI application, rooms go through the WSGI stack in its pool
+            report = {'requests': options['requests']}
+            for name, path, queries in (('availability', '/api/availability/', query_strings),
+                                        ('rooms', '/api/rooms/', ['page_size=20'] * options['requests'])):
+                report[name] = {'wsgi': self.run_wsgi(path, queries, options['wsgi_workers']),
+                                'asgi': self.run_asgi(path, queries, options['concurrency'])}
+        self.stdout.write(json.dumps(report, indent=2))
+
+    @staticmethod
+    def run_wsgi(path, query_strings, workers):
+        application = get_wsgi_application()
+        factory = RequestFactory()
+        samples, statuses, lock = [], {}, threading.Lock()
+
+        def worker(chunk):
+            try:
+                for query_string in chunk:
+                    started = time.perf_counter()
+                    response = application(factory.get(path + '?' + query_string).environ,
+                                           lambda status, headers: None)
+                    status = response.status_code
+                    response.close()
+                    with lock:
+                        samples.append((time.perf_counter() - started) * 1000)
+                        statuses[str(status)] = statuses.get(str(status), 0) + 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(query_strings[i::workers],)) for i in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+        return dict(latency_summary(samples), statuses=statuses, seconds=round(seconds, 3),
+                    requests_per_second=round(len(samples) / seconds, 1))
+
+    @staticmethod
+    def run_asgi(path, query_strings, concurrency):
+        application = HotelASGIApplication(get_wsgi_application())
+        samples, statuses = [], {}
+
+        async def client(chunk):
+            for query_string in chunk:
+                started = time.perf_counter()
+                status, _ = await asgi_get(application, path, query_string)
+                samples.append((time.perf_counter() - started) * 1000)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        async def run():
+            await asyncio.gather(*[client(query_strings[i::concurrency]) for i in range(concurrency)])
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        seconds = time.perf_counter() - started
+        return dict(latency_summary(samples), statuses=statuses, seconds=round(seconds, 3),
+                    requests_per_second=round(len(samples) / seconds, 1))
@@ -0,0 +1,80 @@
+import json
+from contextlib import contextmanager
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from hotel.benchmark import throwaway_database, seed_bookings, measure
+from hotel.models import Room, Booking
+from hotel.validations import check_availability, CustomException
+
+# 0004_search_indexes adds the indexes for the hot paths - the "before" schema is the current one with only this
+# migration's operations reversed (migrating back to 0003 would also drop tables the queries need, e.g. RoomNight)
+INDEXES_MIGRATION = ('hotel', '0004_search_indexes')
+
+
+@contextmanager
+def without_search_indexes():
+    loader = MigrationLoader(connection)
+    migration = loader.get_migration(*INDEXES_MIGRATION)
+    state = loader.project_state(migration.dependencies[0], at_end=True)  # schema of the models before 0004
+    with connection.schema_editor() as schema_editor:
+        migration.unapply(state, schema_editor)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as schema_editor:
+            migration.apply(state, schema_editor)
+
+
+class Command(BaseCommand):
+    help = 'Seeds a throwaway test database and compares search and availability latency before and after ' \
+           'the search indexes migration'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=1000000)
+        parser.add_argument('--rooms', type=int, default=400)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            report = self.run(options)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(self, options):
+        end = seed_bookings(rooms=options['rooms'], bookings=options['bookings'], random_seed=options['seed'])
+        queries = self.queries(end)
+        report = {'bookings': options['bookings'], 'rooms': options['rooms'], 'queries': {}}
+        with without_search_indexes():
+            for name, query in queries.items():
+                report['queries'][name] = {'before': measure(query, options['repeat'])}
+        for name, query in queries.items():
+            report['queries'][name]['after'] = measure(query, options['repeat'])
+        return report
+
+    @staticmethod
+    def queries(end):
+        """Hot path queries of the API, each one evaluated the way the view evaluates it (first page)."""
+        ordering = ('-created', '-id')
+        user_id = Booking.objects.values_list('user', flat=True).first()
+        some_day = end - timedelta(days=30)
+        rooms = list(Room.objects.order_by('number')[:5])
+
+        def availability():
+            try:
+                check_availability(rooms, end, end + timedelta(days=3))
+            except CustomException:
+                pass
+
+        return {
+            'booking_list': lambda: list(Booking.objects.order_by(*ordering)[:50]),
+            'client_booking_list': lambda: list(Booking.objects.filter(user=user_id).order_by(*ordering)[:50]),
+            'search_surname': lambda: list(Booking.objects.filter(surname='Mazur').order_by(*ordering)[:50]),
+            'search_check_in': lambda: list(Booking.objects.filter(check_in=some_day).order_by(*ordering)[:50]),
+            'search_created': lambda: list(Booking.objects.created_on(some_day).order_by(*ordering)[:50]),
+            'search_rooms': lambda: list(Booking.objects.with_rooms(room.number for room in rooms[:2])
+                                         .order_by(*ordering)[:50]),
+            'check_availability': availability,
+            'available_rooms': lambda: list(Room.objects.available_between(end, end + timedelta(days=3))),
+        }
@@ -0,0 +1,62 @@
+import base64
+import json
+from datetime import date, timedelta
+from django.conf import settings
+from django.contrib.auth.models import User, Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from hotel.benchmark import throwaway_database
+from hotel.models import Room, RoomReservation
+from hotel.stress import post_bookings_sustained
+from hotel.validations import find_overlaps
+
+
+class Command(BaseCommand):
+    help = 'Measures the sustained booking write rate of a throwaway SQLite file database, with SQLite defaults ' \
+           'and with SQLITE_PRAGMAS from settings in WAL mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=40)
+        parser.add_argument('--seconds', type=int, default=10)
+        parser.add_argument('--workers', type=int, default=8)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('load_bookings measures SQLite, DATABASE_URL points to ' + connection.vendor)
+        if options['rooms'] < options['workers']:
+            raise CommandError('every worker needs at least one room')
+        report = {}
+        # Basic auth checks the password in every request, PBKDF2 would be measured instead of the database
+        fast_hashers = ['django.contrib.auth.hashers.MD5PasswordHasher']
+        tuned = {'journal_mode': 'wal', 'synchronous': 'normal'}  # the throwaway file may use WAL in any case
+        tuned.update(settings.SQLITE_PRAGMAS)
+        for mode, pragmas in (('defaults', {}), ('pragmas', tuned)):
+            with override_settings(SQLITE_PRAGMAS=pragmas, PASSWORD_HASHERS=fast_hashers):
+                with throwaway_database():
+                    report[mode] = self.run(options)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(self, options):
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        user = User.objects.create_user('load', password='password')
+        group_staff.user_set.add(user)
+        headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'load:password').decode('ascii')}
+        Room.objects.bulk_create([Room(number=number, category=number % 4 + 1)
+                                  for number in range(1, options['rooms'] + 1)])
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        workers = options['workers']
+        first_day = date.today() + timedelta(days=1)
+
+        def make_payload(worker, n):  # every worker books its own rooms one stay after another, nothing is rejected
+            own_rooms = list(range(worker + 1, options['rooms'] + 1, workers))
+            check_in = first_day + timedelta(days=n // len(own_rooms) * 3)
+            return {'surname': 'Load', 'rooms': [own_rooms[n % len(own_rooms)]], 'check_in': check_in,
+                    'check_out': check_in + timedelta(days=2)}
+
+        stats = post_bookings_sustained(make_payload, headers, seconds=options['seconds'], workers=workers)
+        stats['journal_mode'] = journal_mode
+        stats['overlaps'] = len(find_overlaps(RoomReservation.objects.values_list('room', 'check_in', 'check_out')))
+        return stats
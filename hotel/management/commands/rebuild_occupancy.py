@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from hotel.occupancy import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = 'Recomputes occupancy bitmaps of calendars (RoomOccupancy) from room reservations'
+
+    def handle(self, *args, **options):
+        rows = rebuild_occupancy()
+        self.stdout.write(f'{rows} room-year bitmaps rebuilt')
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from hotel.occupancy import rebuild_room_nights
+
+
+class Command(BaseCommand):
+    help = 'Recreates booked room nights (RoomNight) from room reservations, e.g. after rows were imported directly'
+
+    def handle(self, *args, **options):
+        nights = rebuild_room_nights()
+        self.stdout.write(f'{nights} room nights rebuilt')
@@ -0,0 +1,43 @@
+import base64
+import json
+import random
+from datetime import date, timedelta
+from django.contrib.auth.models import User, Group
+from django.core.management.base import BaseCommand
+from hotel.benchmark import throwaway_database
+from hotel.models import Room, RoomReservation
+from hotel.stress import post_bookings_concurrently
+from hotel.validations import find_overlaps
+
+
+class Command(BaseCommand):
+    help = 'Fires parallel booking POSTs at a throwaway test database and reports throughput and overlaps'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            stats = self.run(options)
+        self.stdout.write(json.dumps(stats, indent=2))
+
+    def run(self, options):
+        random.seed(options['seed'])
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        user = User.objects.create_user('stress', password='password')
+        group_staff.user_set.add(user)
+        headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'stress:password').decode('ascii')}
+        Room.objects.bulk_create([Room(number=number, category=number % 4 + 1)
+                                  for number in range(1, options['rooms'] + 1)])
+        first_day = date.today() + timedelta(days=1)
+        payloads = []
+        for _ in range(options['requests']):
+            check_in = first_day + timedelta(days=random.randrange(60))
+            payloads.append({'surname': 'Stress', 'rooms': random.sample(range(1, options['rooms'] + 1), 2),
+                             'check_in': check_in, 'check_out': check_in + timedelta(days=random.randint(1, 5))})
+        stats = post_bookings_concurrently(payloads, headers, workers=options['workers'])
+        stats['overlaps'] = len(find_overlaps(RoomReservation.objects.values_list('room', 'check_in', 'check_out')))
+        return stats
@@ -0,0 +1,144 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# per-view latency, SQL query count and SQL time of every request, aggregated in memory of the worker process
+# (every gunicorn worker has its own numbers, Prometheus labels them by instance) and shown by MetricsView
+# Django 1.11 has no execute_wrapper, queries are taken from the connection's query log (force_debug_cursor)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+N_PLUS_ONE_THRESHOLD = 5  # the same query (up to parameters) this many times in one request
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_lists = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+
+
+def normalize_sql(sql):
+    """Replaces parameters (strings, numbers, IN lists) so that queries differing only in them are equal."""
+    return _lists.sub('(?)', _literals.sub('?', sql))
+
+
+def find_repeated_queries(queries, threshold=N_PLUS_ONE_THRESHOLD):
+    """Takes SQL strings of one request and returns {normalized query: count} of N+1 suspects."""
+    counts = Counter(normalize_sql(sql) for sql in queries)
+    return {sql: count for sql, count in counts.items() if count >= threshold}
+
+
+def request_queries(log, first_query, last_before):
+    """
+    Returns entries of the query log added since it had first_query entries, the last one being last_before.
+    The log keeps only its last maxlen queries, once it is full the start is found by the last entry instead.
+    """
+    queries = list(log)
+    if len(queries) < log.maxlen:
+        return queries[first_query:]
+    for index in range(len(queries) - 1, -1, -1):
+        if queries[index] is last_before:
+            return queries[index + 1:]
+    return queries  # the older ones were dropped
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.sql_seconds = 0
+        self.n_plus_one = 0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, view, seconds, queries, sql_seconds, n_plus_one):
+        with self.lock:
+            metrics = self.views.setdefault(view, ViewMetrics())
+            metrics.duration.observe(seconds)
+            metrics.queries.observe(queries)
+            metrics.sql_seconds += sql_seconds
+            metrics.n_plus_one += bool(n_plus_one)
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+
+        def histogram(name, help_text, attribute):
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} histogram'])
+            for view, metrics in sorted(self.views.items()):
+                values = getattr(metrics, attribute)
+                for bound, count in zip(values.buckets, values.counts):
+                    lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {values.count}')
+                lines.append(f'{name}_sum{{view="{view}"}} {round(values.sum, 6)}')
+                lines.append(f'{name}_count{{view="{view}"}} {values.count}')
+
+        def counter(name, help_text, attribute):
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} counter'])
+            for view, metrics in sorted(self.views.items()):
+                lines.append(f'{name}{{view="{view}"}} {round(getattr(metrics, attribute), 6)}')
+
+        with self.lock:
+            histogram('hotel_request_duration_seconds', 'Time spent in the view, middleware included.', 'duration')
+            histogram('hotel_request_queries', 'SQL queries per request.', 'queries')
+            counter('hotel_request_sql_seconds_total', 'Time spent in SQL queries.', 'sql_seconds')
+            counter('hotel_request_n_plus_one_total', 'Requests repeating the same query (N+1 suspects).',
+                    'n_plus_one')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'HOTEL_METRICS', False):
+            return self.get_response(request)
+        force_debug_cursor = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        log = connection.queries_log  # emptied by Django at the start of every request
+        first_query, last_before = len(log), log[-1] if log else None
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            connection.force_debug_cursor = force_debug_cursor
+        seconds = time.perf_counter() - started
+        queries = request_queries(log, first_query, last_before)
+        repeated = find_repeated_queries([query['sql'] for query in queries])
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unresolved'
+        if repeated:
+            logger.warning('N+1 suspect in %s: %s', view,
+                           '; '.join(f'{count}x {sql[:200]}' for sql, count in repeated.items()))
+        registry.observe(view, seconds, len(queries), sum(float(query['time']) for query in queries), repeated)
+        return response
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.17 on 2026-10-18 04:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_reservations(apps, schema_editor):
+    Booking = apps.get_model('hotel', 'Booking')
+    RoomReservation = apps.get_model('hotel', 'RoomReservation')
+    RoomReservation.objects.bulk_create([
+        RoomReservation(booking_id=booking.id, room_id=room.number, check_in=booking.check_in,
+                        check_out=booking.check_out)
+        for booking in Booking.objects.prefetch_related('rooms') for room in booking.rooms.all()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomReservation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('check_in', models.DateField()),
+                ('check_out', models.DateField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='hotel.Booking')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='hotel.Room')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='roomreservation',
+            index=models.Index(fields=['room', 'check_in', 'check_out'], name='hotel_resv_room_dates_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='roomreservation',
+            unique_together=set([('booking', 'room')]),
+        ),
+        migrations.RunPython(fill_reservations, migrations.RunPython.noop),
+    ]
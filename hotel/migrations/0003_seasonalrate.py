@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.17 on 2026-10-18 04:24
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0002_roomreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeasonalRate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.PositiveSmallIntegerField(choices=[(1, 'A'), (2, 'B'), (3, 'C'), (4, 'D')])),
+                ('start', models.DateField()),
+                ('end', models.DateField()),
+                ('price', models.PositiveIntegerField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.17 on 2026-10-18 04:33
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0003_seasonalrate'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='roomreservation',
+            name='hotel_resv_room_dates_idx',
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created', 'id'], name='hotel_booking_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'created'], name='hotel_booking_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['surname', 'created'], name='hotel_booking_surname_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['check_in', 'check_out'], name='hotel_booking_dates_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['check_out'], name='hotel_booking_check_out_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomreservation',
+            index=models.Index(fields=['room', 'check_out', 'check_in'], name='hotel_resv_room_out_in_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomreservation',
+            index=models.Index(fields=['check_out', 'check_in'], name='hotel_resv_out_in_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# PostgreSQL only - the database itself refuses two reservations of the same room sharing a day (edge days
+# included, like validations.check_availability), and the gist index serves RoomReservation.objects.overlapping().
+# btree_gist is needed for the room_id = part, the extension is trusted since PostgreSQL 13, older versions need
+# it created by a superuser first.
+
+
+def add_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        'ALTER TABLE hotel_roomreservation ADD CONSTRAINT hotel_resv_no_overlap '
+        "EXCLUDE USING gist (room_id WITH =, daterange(check_in, check_out, '[]') WITH &&)"
+    )
+
+
+def remove_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE hotel_roomreservation DROP CONSTRAINT IF EXISTS hotel_resv_no_overlap')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0004_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_exclusion_constraint, remove_exclusion_constraint),
+    ]
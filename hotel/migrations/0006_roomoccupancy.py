@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.17 on 2026-10-18 04:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import defaultdict
+from datetime import date, timedelta
+
+# copies of the bitmap helpers of hotel/occupancy.py as of this migration, the app code may change later
+
+
+def stay_bitmaps(stays):
+    bitmaps = defaultdict(int)
+    for room, check_in, check_out in stays:
+        if check_out <= check_in:
+            continue
+        for year in range(check_in.year, (check_out - timedelta(days=1)).year + 1):
+            first = max(check_in, date(year, 1, 1))
+            end = min(check_out, date(year + 1, 1, 1))
+            bitmaps[room, year] |= ((1 << (end - first).days) - 1) << (first.timetuple().tm_yday - 1)
+    return bitmaps
+
+
+def to_bytes(bitmap):
+    return bitmap.to_bytes(46, 'little')  # 366 nights
+
+
+def fill_occupancy(apps, schema_editor):
+    RoomReservation = apps.get_model('hotel', 'RoomReservation')
+    RoomOccupancy = apps.get_model('hotel', 'RoomOccupancy')
+    bitmaps = stay_bitmaps(RoomReservation.objects.values_list('room', 'check_in', 'check_out').iterator())
+    RoomOccupancy.objects.bulk_create([RoomOccupancy(room_id=room, year=year, nights=to_bytes(bitmap))
+                                       for (room, year), bitmap in bitmaps.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0005_reservation_exclusion_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomOccupancy',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('nights', models.BinaryField()),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='hotel.Room')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='roomoccupancy',
+            unique_together=set([('room', 'year')]),
+        ),
+        migrations.RunPython(fill_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.17 on 2026-10-18 05:01
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+from datetime import timedelta
+
+
+def fill_room_nights(apps, schema_editor):
+    RoomReservation = apps.get_model('hotel', 'RoomReservation')
+    RoomNight = apps.get_model('hotel', 'RoomNight')
+    nights = []  # inserted in batches, the whole history would not fit in memory
+    for booking, room, check_in, check_out in RoomReservation.objects.values_list(
+            'booking', 'room', 'check_in', 'check_out').iterator():
+        nights.extend(RoomNight(booking_id=booking, room_id=room, date=check_in + timedelta(days=n))
+                      for n in range((check_out - check_in).days))
+        if len(nights) >= 5000:
+            RoomNight.objects.bulk_create(nights)
+            nights = []
+    RoomNight.objects.bulk_create(nights)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0006_roomoccupancy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomNight',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_nights', to='hotel.Booking')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_nights', to='hotel.Room')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='roomnight',
+            index=models.Index(fields=['date'], name='hotel_night_date_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='roomnight',
+            unique_together=set([('room', 'date')]),
+        ),
+        migrations.RunPython(fill_room_nights, migrations.RunPython.noop),
+    ]
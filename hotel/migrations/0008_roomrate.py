@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.17 on 2026-10-18 05:07
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_room_rates(apps, schema_editor):
+    RoomRate = apps.get_model('hotel', 'RoomRate')
+    RoomRate.objects.bulk_create([RoomRate(category=category, price=price)
+                                  for category, price in [(1, 200), (2, 150), (3, 100), (4, 50)]])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0007_roomnight'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomRate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.PositiveSmallIntegerField(choices=[(1, 'A'), (2, 'B'), (3, 'C'), (4, 'D')], unique=True)),
+                ('price', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.RunPython(fill_room_rates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# PostgreSQL only - with a locale other than C a plain btree index cannot serve LIKE 'prefix%', so surname
+# prefix search (BookingQuerySet.surname_starts_with) gets an index with the pattern operator class. Other
+# backends use hotel_booking_surname_idx.
+
+
+def add_pattern_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS hotel_booking_surname_like ON hotel_booking (surname varchar_pattern_ops)'
+    )
+
+
+def remove_pattern_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS hotel_booking_surname_like')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0008_roomrate'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_pattern_index, remove_pattern_index),
+    ]
@@ -1,18 +1,76 @@
-from django.db import models
+from django.db import models, connections
+from django.db.models import F, Count, Func, Value
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from datetime import datetime, time, timedelta
 from django.utils import timezone
-from .config import ROOM_CATEGORIES, ROOM_PRICES
+from .config import ROOM_CATEGORIES, CATEGORY_NAMES
+from .pricing import Nights, booking_price
+
+class RoomQuerySet(models.QuerySet):
+    def available_between(self, check_in, check_out, category=None):
+        # set-based counterpart of validations.check_availability - rooms without any blocking night
+        booked = RoomNight.objects.blocking(check_in, check_out).values('room')
+        queryset = self.exclude(number__in=booked)
+        return queryset if category is None else queryset.filter(category=category)
+
 
 class Room(models.Model):
     number = models.IntegerField(unique=True, primary_key=True)
     category = models.PositiveSmallIntegerField(choices=ROOM_CATEGORIES)
 
+    objects = RoomQuerySet.as_manager()
+
     def __str__(self):
-        return f'Room {self.number}, class {ROOM_CATEGORIES[self.category - 1][1]}'
+        return f'Room {self.number}, class {CATEGORY_NAMES[self.category]}'
 
     @property
     def get_category(self):
-        return ROOM_CATEGORIES[self.category - 1][1]
+        return CATEGORY_NAMES[self.category]
+
+
+class BookingQuerySet(models.QuerySet):
+    def with_price(self):
+        # nights and price (see pricing.py) computed by the database, usable in order_by(), filter() and aggregate()
+        return self.annotate(nights=Nights(F('check_out'), F('check_in')), price=booking_price())
+
+    def with_details(self):
+        """
+        Everything that booking lists render (user, rooms, nights, price) in a constant number of queries.
+        """
+        return self.select_related('user').prefetch_related('rooms').with_price()
+
+    def with_rooms(self, rooms):
+        """
+        Bookings containing all given rooms (and possibly others) - a single GROUP BY/HAVING subquery on the
+        rooms table instead of one JOIN per room, so no DISTINCT is needed either.
+        """
+        rooms = set(rooms)
+        matching = Booking.rooms.through.objects.filter(room__in=rooms).values('booking') \
+            .annotate(matched=Count('room')).filter(matched=len(rooms)).values('booking')
+        return self.filter(pk__in=matching)
+
+    def created_on(self, day):
+        # a range on the indexed column, created__date would wrap every row in a date cast
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+        return self.filter(created__gte=start, created__lt=end)
+
+    def active_between(self, start=None, end=None):
+        # bookings overlapping the (inclusive) period, either end may be left open
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(check_out__gte=start)
+        if end is not None:
+            queryset = queryset.filter(check_in__lte=end)
+        return queryset
+
+    def surname_starts_with(self, prefix):
+        # LIKE 'prefix%' uses an index on PostgreSQL (pattern index, migration 0009) and MySQL, but never on SQLite,
+        # whose LIKE is case-insensitive - there the same prefix is a range of hotel_booking_surname_idx
+        if connections[self.db].vendor == 'sqlite':
+            return self.filter(surname__gte=prefix, surname__lt=prefix + '\U0010ffff')
+        return self.filter(surname__startswith=prefix)
 
 
 class Booking(models.Model):
@@ -23,16 +81,155 @@ class Booking(models.Model):
     check_out = models.DateField()
     created = models.DateTimeField(default=timezone.now, editable=False)
 
+    objects = BookingQuerySet.as_manager()
+
+    class Meta:
+        # lists are ordered by -created, -id (pagination.py), search (SearchViewSet) filters by surname and dates,
+        # clients only see their own bookings
+        indexes = [
+            models.Index(fields=['created', 'id'], name='hotel_booking_created_idx'),
+            models.Index(fields=['user', 'created'], name='hotel_booking_user_created_idx'),
+            models.Index(fields=['surname', 'created'], name='hotel_booking_surname_idx'),
+            models.Index(fields=['check_in', 'check_out'], name='hotel_booking_dates_idx'),
+            models.Index(fields=['check_out'], name='hotel_booking_check_out_idx'),
+        ]
+
     def __str__(self):
         return f'{self.user}, {self.surname} has booked {[x for x in self.rooms.all()]}, from {self.check_in} to {self.check_out}'
 
     @property
     def get_rooms(self):
-        return f'{[x for x in self.rooms.values_list("number", flat=True)]}'[1:-1]
+        # rooms.all() instead of values_list() so that prefetched rooms are reused
+        return ', '.join(str(x.number) for x in self.rooms.all())
 
     def get_booking_time(self):
+        if hasattr(self, 'nights'):  # annotated by BookingQuerySet.with_details()
+            return self.nights
         return int((self.check_out - self.check_in).days)
 
     def get_booking_price(self):
-        rooms_categories = [x.get_category for x in self.rooms.all()]
-        return sum([self.get_booking_time() * ROOM_PRICES[x] for x in rooms_categories])
+        if hasattr(self, 'price'):  # annotated by BookingQuerySet.with_details()
+            return self.price
+        # the same SQL as for lists, so seasonal rates are applied in a single place
+        return Booking.objects.with_price().values_list('price', flat=True).get(pk=self.pk)
+
+
+class RoomReservationQuerySet(models.QuerySet):
+    def overlapping(self, check_in, check_out):
+        """
+        Reservations sharing at least one day with check_in..check_out (the same edge days are treated as
+        overlapping). On PostgreSQL compared as date ranges, which is served by the gist index of the exclusion
+        constraint added in migration 0005.
+        """
+        if connections[self.db].vendor == 'postgresql':
+            from django.contrib.postgres.fields import DateRangeField
+            from psycopg2.extras import DateRange
+            span = Func(F('check_in'), F('check_out'), Value('[]'), function='daterange', output_field=DateRangeField())
+            return self.annotate(span=span).filter(span__overlap=DateRange(check_in, check_out, '[]'))
+        return self.filter(check_in__lte=check_out, check_out__gte=check_in)
+
+
+# RoomReservation, RoomNight and RoomOccupancy are derived from Booking and kept in sync with it by signals.py,
+# never edit their rows directly
+
+
+class RoomReservation(models.Model):
+    """
+    Interval index of booked rooms - one row per (booking, room) with booking dates copied over,
+    so overlap checks are a single indexed query instead of a scan of every booking of a room.
+    """
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='reservations')
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='reservations')
+    check_in = models.DateField()
+    check_out = models.DateField()
+
+    objects = RoomReservationQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('booking', 'room')
+        # overlap predicate is check_in <= X and check_out >= Y, the second part is the selective one (most of
+        # the history ended long ago), so check_out goes before check_in
+        indexes = [
+            models.Index(fields=['room', 'check_out', 'check_in'], name='hotel_resv_room_out_in_idx'),
+            models.Index(fields=['check_out', 'check_in'], name='hotel_resv_out_in_idx'),
+        ]
+
+    def __str__(self):
+        return f'Room {self.room_id} reserved by booking {self.booking_id}, from {self.check_in} to {self.check_out}'
+
+
+class RoomNightQuerySet(models.QuerySet):
+    def blocking(self, check_in, check_out):
+        # nights which make a room unavailable from check_in to check_out - the same edge days are treated as
+        # overlapping, so also the last night of a stay leaving on check_in (the day before) and the first night
+        # of a stay arriving on check_out
+        return self.filter(date__gte=check_in - timedelta(days=1), date__lte=check_out)
+
+
+class RoomNight(models.Model):
+    """
+    One row per booked night of a room (check_in..check_out - 1 of the booking), so "who is in room X on day D"
+    is a lookup of the unique (room, date) index, which also stops two bookings from sharing a night on every
+    database.
+    """
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='room_nights')
+    date = models.DateField()
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='room_nights')
+
+    objects = RoomNightQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('room', 'date')
+        indexes = [models.Index(fields=['date'], name='hotel_night_date_idx')]  # occupancy of a night
+
+    def __str__(self):
+        return f'Room {self.room_id} booked by booking {self.booking_id} on the night of {self.date}'
+
+
+class RoomOccupancy(models.Model):
+    """
+    Booked nights of a room in a year as a bitmap (see occupancy.py), a precomputed room x date grid for calendars.
+    Rebuilt from RoomReservation whenever a booking of the room changes.
+    """
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='occupancy')
+    year = models.PositiveSmallIntegerField()
+    nights = models.BinaryField()
+
+    class Meta:
+        unique_together = ('room', 'year')
+
+    def __str__(self):
+        return f'Occupancy of room {self.room_id} in {self.year}'
+
+
+class RoomRate(models.Model):
+    """
+    Base price of a night in a room category, categories without a row cost their default from ROOM_PRICES.
+    Read through pricing.get_room_rates(), which is cached.
+    """
+    category = models.PositiveSmallIntegerField(choices=ROOM_CATEGORIES, unique=True)
+    price = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f'Class {CATEGORY_NAMES[self.category]}, {self.price} per night'
+
+
+class SeasonalRate(models.Model):
+    """
+    Price of a night in a room category between start and end (both inclusive), replaces the base price
+    (RoomRate) for those nights. Periods of one category must not overlap.
+    """
+    category = models.PositiveSmallIntegerField(choices=ROOM_CATEGORIES)
+    start = models.DateField()
+    end = models.DateField()
+    price = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f'Class {CATEGORY_NAMES[self.category]}, {self.price} from {self.start} to {self.end}'
+
+    def clean(self):
+        if self.start > self.end:
+            raise ValidationError('Season start should not be after its end')
+        overlapping = SeasonalRate.objects.filter(category=self.category, start__lte=self.end, end__gte=self.start)
+        if overlapping.exclude(pk=self.pk).exists():
+            raise ValidationError('Seasons of one room class cannot overlap')
@@ -0,0 +1,117 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from django.db import transaction
+from .models import Room, RoomReservation, RoomNight, RoomOccupancy
+
+# room x date grid of booked nights for calendars (CalendarViewSet, CalendarView) - one bitmap per room and year
+# in RoomOccupancy, bit n is the night after day n of the year (bit 0 is the night from January 1st to 2nd)
+# a stay books the nights check_in..check_out - 1, so on a calendar a guest leaving on the day another one
+# arrives does not show twice (availability still treats such edge days as overlapping)
+# bitmaps are rebuilt from RoomReservation only for the rooms and years touched by a change (signals.py, bulk.py),
+# a grid of any size is then read by a single query and a few bit shifts per room
+# RoomNight has the same nights as rows, for lookups of single nights and availability checks (models.py)
+
+YEAR_BYTES = 46  # 366 nights
+NIGHTS_BATCH_SIZE = 5000
+
+
+def night_index(day):
+    return day.timetuple().tm_yday - 1
+
+
+def stay_years(check_in, check_out):
+    if check_out <= check_in:
+        return range(0)
+    return range(check_in.year, (check_out - timedelta(days=1)).year + 1)
+
+
+def stay_bitmaps(stays):
+    """Takes (room, check_in, check_out) tuples and returns {(room, year): bitmap of booked nights as int}."""
+    bitmaps = defaultdict(int)
+    for room, check_in, check_out in stays:
+        for year in stay_years(check_in, check_out):
+            first = max(check_in, date(year, 1, 1))
+            end = min(check_out, date(year + 1, 1, 1))
+            bitmaps[room, year] |= ((1 << (end - first).days) - 1) << night_index(first)
+    return bitmaps
+
+
+def to_bytes(bitmap):
+    return bitmap.to_bytes(YEAR_BYTES, 'little')
+
+
+def from_bytes(data):
+    return int.from_bytes(bytes(data), 'little')
+
+
+def refresh_occupancy(stays):
+    """
+    Rebuilds bitmaps of the rooms and years touched by (room, check_in, check_out) tuples - both old and new
+    dates of a changed booking. Runs in the transaction of the change, which holds write locks of the rooms
+    (locking.lock_rooms_for_update), so parallel changes of a room cannot overwrite each other's bitmaps.
+    """
+    rooms_per_year = defaultdict(set)
+    for room, check_in, check_out in stays:
+        for year in stay_years(check_in, check_out):
+            rooms_per_year[year].add(room)
+    for year, rooms in rooms_per_year.items():
+        start, end = date(year, 1, 1), date(year + 1, 1, 1)
+        bitmaps = stay_bitmaps(RoomReservation.objects.filter(room__in=rooms, check_in__lt=end, check_out__gt=start)
+                               .values_list('room', 'check_in', 'check_out'))
+        RoomOccupancy.objects.filter(room__in=rooms, year=year).delete()
+        RoomOccupancy.objects.bulk_create([RoomOccupancy(room_id=room, year=year, nights=to_bytes(bitmaps[room, year]))
+                                           for room in sorted(rooms) if bitmaps.get((room, year))])
+
+
+def rebuild_occupancy():
+    """Recomputes all bitmaps, e.g. after reservations were inserted without signals. Returns number of rows."""
+    bitmaps = stay_bitmaps(RoomReservation.objects.values_list('room', 'check_in', 'check_out').iterator())
+    with transaction.atomic():
+        RoomOccupancy.objects.all().delete()
+        RoomOccupancy.objects.bulk_create([RoomOccupancy(room_id=room, year=year, nights=to_bytes(bitmap))
+                                           for (room, year), bitmap in sorted(bitmaps.items())])
+    return len(bitmaps)
+
+
+def occupancy_grid(date_from, date_to):
+    """
+    Returns [(room number, nights)] of all rooms, nights is a string with one '0' (free) or '1' (booked)
+    per night from date_from to date_to (both inclusive).
+    """
+    years = range(date_from.year, date_to.year + 1)
+    stored = {(room, year): from_bytes(nights) for room, year, nights
+              in RoomOccupancy.objects.filter(year__in=years).values_list('room', 'year', 'nights')}
+    spans = []  # (year, first night index, number of nights)
+    for year in years:
+        first, last = max(date_from, date(year, 1, 1)), min(date_to, date(year, 12, 31))
+        spans.append((year, night_index(first), (last - first).days + 1))
+    grid = []
+    for room in Room.objects.order_by('number').values_list('number', flat=True):
+        nights = []
+        for year, start, length in spans:
+            bits = stored.get((room, year), 0) >> start & ((1 << length) - 1)
+            nights.append(format(bits, f'0{length}b')[::-1])  # lowest bit (first night) first
+        grid.append((room, ''.join(nights)))
+    return grid
+
+
+def stay_nights(booking, room, check_in, check_out):
+    """Returns unsaved RoomNight rows of a booking (id) in a room (number)."""
+    return [RoomNight(booking_id=booking, room_id=room, date=check_in + timedelta(days=n))
+            for n in range((check_out - check_in).days)]
+
+
+def rebuild_room_nights():
+    """Recreates all RoomNight rows from RoomReservation. Returns number of nights."""
+    count = 0
+    with transaction.atomic():
+        RoomNight.objects.all().delete()
+        nights = []  # inserted in batches, the whole history would not fit in memory
+        for stay in RoomReservation.objects.values_list('booking', 'room', 'check_in', 'check_out').iterator():
+            nights.extend(stay_nights(*stay))
+            if len(nights) >= NIGHTS_BATCH_SIZE:
+                RoomNight.objects.bulk_create(nights)
+                count += len(nights)
+                nights = []
+        RoomNight.objects.bulk_create(nights)
+    return count + len(nights)
@@ -0,0 +1,107 @@
+import json
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+# keyset (cursor) pagination - every page is a single indexed range query, no OFFSET and no COUNT(*),
+# so response time does not depend on how many bookings are already in the table
+
+
+def following_rows(ordering, values):
+    """
+    Q of the rows following a row with `values` of the `ordering` fields (order_by() arguments ending with
+    a unique field): (a > x) or (a = x and b > y) or ...
+    """
+    condition, equal = Q(), Q()
+    for order, value in zip(ordering, values):
+        field = order.lstrip('-')
+        lookup = '__lt' if order.startswith('-') else '__gt'
+        condition |= equal & Q(**{field + lookup: value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    CursorPagination positioned by all ordering fields of the boundary row. DRF's own keeps only the first field
+    and skips rows sharing its value (the same price or check_in) by OFFSET, which grows with every page of ties.
+    Orderings have to end with a unique field (StableOrderingFilter appends id), so positions are unique and
+    the offset of a cursor is always 0.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # CursorPagination.paginate_queryset() with the position filter of keyset_filter()
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self.keyset_filter(ordering, current_position))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following_position = len(results) > len(self.page)
+        following_position = self._get_position_from_instance(results[-1], self.ordering) \
+            if has_following_position else None
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = has_following_position
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position, self.previous_position = following_position, current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def keyset_filter(self, ordering, position):
+        """Rows following the position (values of the ordering fields) in the ordering."""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return following_rows(ordering, values)
+
+    def _get_position_from_instance(self, instance, ordering):
+        fields = [order.lstrip('-') for order in ordering]
+        if isinstance(instance, dict):
+            return json.dumps([str(instance[field]) for field in fields])
+        return json.dumps([str(getattr(instance, field)) for field in fields])
+
+
+class BookingCursorPagination(KeysetCursorPagination):
+    ordering = ('-created', '-id')  # newest first, id breaks ties between bookings created at the same time
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class RoomCursorPagination(KeysetCursorPagination):
+    ordering = 'number'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class StableOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter that adds id as the last ordering field, so that rows with equal values
+    (e.g. the same price) are ordered the same way in every page query, and the positions
+    of KeysetCursorPagination are unique.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view) or [])
+        if ordering and not {'id', '-id', 'pk', '-pk'} & set(ordering):
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+        return tuple(ordering)
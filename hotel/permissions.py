@@ -1,4 +1,4 @@
-from django.contrib.auth.models import Group
+from django.core.cache import cache
 from rest_framework import permissions
 
 REQ_GROUPS_ROOMS = {'GET': ['__all__'],
@@ -17,14 +17,37 @@ REQ_GROUPS_BOOKINGS_UPDATE = {'GET': ['Staff'],
                               'DELETE': ['Staff']}
 
 
+USER_GROUPS_CACHE_KEY = 'hotel:user-groups:{}'
+USER_GROUPS_CACHE_TIMEOUT = 60 * 5  # see TABLE_VERSION_CACHE_TIMEOUT in caching.py
+
+
+def get_user_groups(user):
+    """
+    Takes a user and returns a frozenset of names of the user's groups.
+    Cached on the user object for the current request and in the cache across requests,
+    the cache entry is removed by signals whenever group membership changes.
+    """
+    if not user or not user.is_authenticated:
+        return frozenset()
+    groups = getattr(user, '_hotel_groups', None)
+    if groups is None:
+        groups = cache.get(USER_GROUPS_CACHE_KEY.format(user.id))
+        if groups is None:
+            groups = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(USER_GROUPS_CACHE_KEY.format(user.id), groups, USER_GROUPS_CACHE_TIMEOUT)
+        user._hotel_groups = groups
+    return groups
+
+
+def forget_user_groups(user_ids):
+    cache.delete_many([USER_GROUPS_CACHE_KEY.format(user_id) for user_id in user_ids])
+
+
 def is_in_group(user, group_name):
     """
     Takes a user and a group name, and returns `True` if the user is in that group.
     """
-    try:
-        return Group.objects.get(name=group_name).user_set.filter(id=user.id).exists()
-    except Group.DoesNotExist:
-        return None
+    return group_name in get_user_groups(user)
 
 
 class HasGroupPermission(permissions.BasePermission):
@@ -0,0 +1,129 @@
+from datetime import timedelta
+from json import dumps
+from django.core.cache import cache
+from django.db.models import Func, Case, When, Value, Sum, F, OuterRef, Subquery, ExpressionWrapper, \
+    IntegerField, DateField
+from django.db.models.functions import Coalesce, Greatest, Least
+from .config import ROOM_CATEGORIES, ROOM_PRICES
+
+# booking prices computed by the database, so they can be used for sorting, filtering and aggregation
+# price of a room for a stay = sum of its nights, every night costs the seasonal rate of the room category
+# if the night falls into a SeasonalRate period, otherwise the base rate (RoomRate, default from ROOM_PRICES)
+
+
+class Nights(Func):
+    """
+    Number of nights between two date expressions (check_out, check_in), computed by the database.
+    """
+    template = '(%(expressions)s)'  # PostgreSQL: date - date is an integer number of days
+    arg_joiner = ' - '
+
+    def __init__(self, check_out, check_in, **extra):
+        super().__init__(check_out, check_in, output_field=IntegerField(), **extra)
+
+    def as_sqlite(self, compiler, connection):
+        return self.as_sql(compiler, connection, template='CAST(julianday(%(expressions)s) AS INTEGER)',
+                           arg_joiner=') - julianday(')
+
+    def as_mysql(self, compiler, connection):
+        return self.as_sql(compiler, connection, template='DATEDIFF(%(expressions)s)', arg_joiner=', ')
+
+
+SEASONAL_RATES_CACHE_KEY = 'hotel:seasonal-rates'
+SEASONAL_RATES_CACHE_TIMEOUT = 60  # see TABLE_VERSION_CACHE_TIMEOUT in caching.py
+
+
+def get_seasonal_rates():
+    # the table is tiny and read by every priced query, signals drop the cached copy when it changes
+    rates = cache.get(SEASONAL_RATES_CACHE_KEY)
+    if rates is None:
+        from .models import SeasonalRate
+        rates = list(SeasonalRate.objects.all())
+        cache.set(SEASONAL_RATES_CACHE_KEY, rates, SEASONAL_RATES_CACHE_TIMEOUT)
+    return rates
+
+
+def forget_seasonal_rates():
+    cache.delete(SEASONAL_RATES_CACHE_KEY)
+
+
+ROOM_RATES_CACHE_KEY = 'hotel:room-rates'
+ROOM_RATES_CACHE_TIMEOUT = 60  # see TABLE_VERSION_CACHE_TIMEOUT in caching.py
+
+
+class RoomRates:
+    """
+    Base prices of a night per room category - by category number, by category name and the latter already
+    serialized to JSON for the price calculators of book.html and booking_edit.html.
+    """
+
+    def __init__(self, prices):
+        self.by_number = prices
+        self.by_name = {name: prices[number] for number, name in ROOM_CATEGORIES}
+        self.json = dumps(self.by_name)
+
+
+def get_room_rates():
+    # the same caching as of seasonal rates, signals drop the cached copy when a RoomRate changes
+    rates = cache.get(ROOM_RATES_CACHE_KEY)
+    if rates is None:
+        from .models import RoomRate
+        prices = {number: ROOM_PRICES[name] for number, name in ROOM_CATEGORIES}
+        prices.update(RoomRate.objects.values_list('category', 'price'))
+        rates = RoomRates(prices)
+        cache.set(ROOM_RATES_CACHE_KEY, rates, ROOM_RATES_CACHE_TIMEOUT)
+    return rates
+
+
+def forget_room_rates():
+    cache.delete(ROOM_RATES_CACHE_KEY)
+
+
+def stay_price(check_in, check_out, category, seasonal_rates=None):
+    """
+    Expression with the price of one room for nights from `check_in` to `check_out` (expressions or field names),
+    `category` is the name of the room category field. Rates are read once per query, not per row.
+    """
+    if seasonal_rates is None:
+        seasonal_rates = get_seasonal_rates()
+    base_prices = get_room_rates().by_number
+    check_in, check_out = [F(x) if isinstance(x, str) else x for x in [check_in, check_out]]
+    whens = []
+    for number, _ in ROOM_CATEGORIES:
+        price = Nights(check_out, check_in) * Value(base_prices[number])
+        for rate in seasonal_rates:
+            if rate.category != number:
+                continue
+            # nights inside the season cost (rate - base) more, rate.end is the last night of the season
+            season_nights = Greatest(Nights(Least(check_out, Value(rate.end + timedelta(days=1), DateField())),
+                                            Greatest(check_in, Value(rate.start, DateField()))), Value(0))
+            price = price + season_nights * Value(rate.price - base_prices[number])
+        whens.append(When(**{category: number}, then=price))
+    return Case(*whens, default=Value(0), output_field=IntegerField())
+
+
+def night_price(day, category, seasonal_rates=None):
+    """
+    Expression with the price of one night (`day` is its date) in a room of `category`, both field names - the
+    same rates as of stay_price(), for querysets with a row per night (RoomNight).
+    """
+    if seasonal_rates is None:
+        seasonal_rates = get_seasonal_rates()
+    base_prices = get_room_rates().by_number
+    whens = [When(**{category: rate.category, f'{day}__range': (rate.start, rate.end)}, then=Value(rate.price))
+             for rate in seasonal_rates]
+    whens += [When(**{category: number}, then=Value(base_prices[number])) for number, _ in ROOM_CATEGORIES]
+    return Case(*whens, default=Value(0), output_field=IntegerField())
+
+
+def booking_price():
+    """
+    Expression with the total price of a booking (all its rooms), to be used in Booking querysets.
+    Correlated subquery over RoomReservation, so joins added by filtering on rooms do not multiply it.
+    """
+    from .models import RoomReservation
+    total = RoomReservation.objects.filter(booking=OuterRef('pk')).values('booking').annotate(
+        total=Sum(stay_price('check_in', 'check_out', 'room__category'))
+    ).values('total')
+    return ExpressionWrapper(Coalesce(Subquery(total, output_field=IntegerField()), Value(0)),
+                             output_field=IntegerField())
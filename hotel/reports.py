@@ -0,0 +1,103 @@
+import hashlib
+from datetime import date, timedelta
+from django.core.cache import cache
+from django.db.models import Sum, Count, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .caching import get_table_versions
+from .config import ROOM_CATEGORIES
+from .models import Room, RoomNight
+from .pricing import night_price
+
+# occupancy and revenue per day or month, aggregated by the database from RoomNight (one row per booked night)
+# a night belongs to the period of its date, so bookings crossing a period boundary are split between periods
+# closed periods (ended before today) are cached under the versions of the tables they are computed from
+# (caching.py), so a changed past booking, room or rate makes them stale, the others are computed by one query
+
+REPORT_CACHE_KEY = 'hotel:report:{}:{}:{}'
+REPORT_CACHE_TIMEOUT = 60 * 60 * 24
+REPORT_TABLES = ('booking', 'room', 'roomrate', 'seasonalrate')
+
+
+def split_periods(date_from, date_to, period):
+    """
+    Returns list of (start, end) tuples covering date_from..date_to (both inclusive), end is exclusive.
+    """
+    periods = []
+    start = date_from
+    while start <= date_to:
+        if period == 'day':
+            end = start + timedelta(days=1)
+        else:
+            end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        periods.append((start, min(end, date_to + timedelta(days=1))))
+        start = end
+    return periods
+
+
+def period_stats(periods, period):
+    """
+    Takes (start, end) tuples of split_periods() and returns {(start, end): {category number: (sold room nights,
+    revenue)}} for nights from start to end (exclusive).
+    """
+    versions = hashlib.md5('|'.join(get_table_versions(REPORT_TABLES)).encode()).hexdigest()
+    keys = {(start, end): REPORT_CACHE_KEY.format(versions, start, end) for start, end in periods}
+    cached = cache.get_many(list(keys.values()))
+    stats = {dates: cached[key] for dates, key in keys.items() if key in cached}
+    missing = [dates for dates in periods if dates not in stats]
+    if not missing:
+        return stats
+    # periods are consecutive, so every night between the first missing start and the last missing end belongs
+    # to exactly one period - a month is grouped by its first day, nights of cached periods are ignored
+    bucket = (lambda day: day.replace(day=1)) if period == 'month' else (lambda day: day)
+    by_bucket = {bucket(start): (start, end) for start, end in missing}
+    for dates in missing:
+        stats[dates] = {}
+    rows = RoomNight.objects.filter(date__gte=missing[0][0], date__lt=missing[-1][1]) \
+        .values(bucket=TruncMonth('date') if period == 'month' else F('date'), category=F('room__category')) \
+        .annotate(room_nights=Count('id'), revenue=Sum(night_price('date', 'room__category'))).order_by()
+    for row in rows:
+        dates = by_bucket.get(row['bucket'])
+        if dates is not None:
+            stats[dates][row['category']] = (row['room_nights'], row['revenue'])
+    today = timezone.localdate()
+    cache.set_many({keys[dates]: stats[dates] for dates in missing if dates[1] <= today}, REPORT_CACHE_TIMEOUT)
+    return stats
+
+
+def build_report(date_from, date_to, period):
+    rooms = dict(Room.objects.values_list('category').annotate(count=Count('number')).order_by())
+    periods = split_periods(date_from, date_to, period)
+    all_stats = period_stats(periods, period)
+    results = []
+    for start, end in periods:
+        stats = all_stats[start, end]
+        days = (end - start).days
+        categories = {}
+        for number, name in ROOM_CATEGORIES:
+            room_nights, revenue = stats.get(number, (0, 0))
+            available = rooms.get(number, 0) * days
+            categories[name] = {'room_nights': room_nights, 'available_room_nights': available,
+                                'occupancy': round(room_nights / available, 4) if available else None,
+                                'revenue': revenue}
+        room_nights = sum(x['room_nights'] for x in categories.values())
+        available = sum(x['available_room_nights'] for x in categories.values())
+        results.append({'start': start, 'end': end - timedelta(days=1),
+                        'room_nights': room_nights, 'available_room_nights': available,
+                        'occupancy': round(room_nights / available, 4) if available else None,
+                        'revenue': sum(x['revenue'] for x in categories.values()),
+                        'categories': categories})
+    return results
+
+
+def occupancy_report(date_from, date_to, period):
+    fields = ['start', 'end', 'room_nights', 'available_room_nights', 'occupancy']
+    return [dict({x: row[x] for x in fields},
+                 categories={name: {x: values[x] for x in fields[2:]} for name, values in row['categories'].items()})
+            for row in build_report(date_from, date_to, period)]
+
+
+def revenue_report(date_from, date_to, period):
+    return [{'start': row['start'], 'end': row['end'], 'revenue': row['revenue'],
+             'categories': {name: values['revenue'] for name, values in row['categories'].items()}}
+            for row in build_report(date_from, date_to, period)]
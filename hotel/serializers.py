@@ -1,46 +1,149 @@
 
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 from rest_framework.serializers import ValidationError
 from .models import Room, Booking
-from .validations import check_timespan, check_availability
+from .validations import check_timespan, check_availability, CustomException
+from .locking import lock_rooms_for_update, retry_on_locked
+from .config import ROOM_CATEGORIES
 
 class RoomSerializer(serializers.ModelSerializer):
     class Meta:
         model = Room
         fields = ['number', 'category']
 
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """
+    ManyRelatedField resolving all primary keys with one query, PrimaryKeyRelatedField queries them one by one.
+    Errors are the same as of PrimaryKeyRelatedField.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        keys = []
+        for key in data:
+            if isinstance(key, bool) or not isinstance(key, (int, str)):
+                self.child_relation.fail('incorrect_type', data_type=type(key).__name__)
+            try:
+                keys.append(int(key))
+            except ValueError:
+                self.child_relation.fail('incorrect_type', data_type=type(key).__name__)
+        objects = self.child_relation.get_queryset().in_bulk(keys)
+        for key in keys:
+            if key not in objects:
+                self.child_relation.fail('does_not_exist', pk_value=key)
+        return [objects[key] for key in keys]
+
+
 class BookingSerializer(serializers.ModelSerializer):
 
     get_booking_time = serializers.ReadOnlyField()
     get_booking_price = serializers.ReadOnlyField()  # source='get_booking_price' from Booking, models.py
 
     user = serializers.PrimaryKeyRelatedField(read_only=True, default=serializers.CurrentUserDefault())
+    rooms = BulkManyRelatedField(child_relation=serializers.PrimaryKeyRelatedField(queryset=Room.objects.all()),
+                                 allow_empty=False)
+
+    def to_internal_value(self, data):
+        # dates and rooms are checked together once all fields are parsed, errors stay under 'rooms' (validate()
+        # would report them as non_field_errors)
+        attrs = super().to_internal_value(data)
+        try:
+            check_timespan(attrs['check_in'], attrs['check_out'])
+            # self.instance is not None when the method is PUT (or POST but from frontend views which is treated
+            # like PUT), lock_rooms() checks again in the database, so the cached snapshot is good enough here
+            check_availability(attrs['rooms'], attrs['check_in'], attrs['check_out'], booking_to_exclude=self.instance,
+                               cached=True)
+        except CustomException as error:
+            raise CustomException({'rooms': error.detail})
+        return attrs
+
+    def create(self, validated_data):
+        def save():  # ModelSerializer.create() pops rooms, every attempt gets its own copy
+            with transaction.atomic():
+                data = dict(validated_data)
+                self.lock_rooms(data)
+                return self.load_for_response(super(BookingSerializer, self).create(data))
+        return retry_on_locked(save)
+
+    def update(self, instance, validated_data):
+        moved = (validated_data['check_in'], validated_data['check_out']) != (instance.check_in, instance.check_out)
+
+        def save():
+            with transaction.atomic():
+                data = dict(validated_data)
+                self.lock_rooms(data)
+                if moved:
+                    # save() would move the nights of the old rooms to the new dates (signals.py) before rooms
+                    # are set, a room the booking is leaving may be booked by someone else on those dates - the
+                    # nights are dropped first and created once for the final rooms and dates by rooms.set()
+                    instance.rooms.clear()
+                return self.load_for_response(super(BookingSerializer, self).update(instance, data))
+        return retry_on_locked(save)
+
+    @staticmethod
+    def load_for_response(instance):
+        # price and rooms are loaded in the same transaction, so the response needs no more queries after commit
+        instance.nights, instance.price = Booking.objects.with_price().values_list('nights', 'price').get(pk=instance.pk)
+        prefetch_related_objects([instance], 'rooms')
+        return instance
 
-    def validate_rooms(self, data):
-        check_in = self.initial_data['check_in']
-        check_out = self.initial_data['check_out']
-        check_timespan(check_in, check_out)
-        for room_to_book in data:
-            if self.instance is not None:
-                # satisfied when the method is PUT (or POST but from frontend views which is treated like PUT)
-                check_availability(room_to_book, check_in, check_out, booking_to_exclude=self.instance)
-            else:
-                check_availability(room_to_book, check_in, check_out)
-        return data
+    def lock_rooms(self, validated_data):
+        # validation runs before the transaction, so availability is checked again while holding write locks
+        # of the rooms (see locking.py) - parallel requests for the same rooms are serialized and the second one
+        # sees the reservation of the first one
+        rooms = validated_data['rooms']
+        numbers = {room.number for room in rooms}
+        if self.instance is not None:  # the rooms the booking is leaving get their nights and bitmaps changed too
+            numbers.update(self.instance.rooms.values_list('number', flat=True))
+        lock_rooms_for_update(numbers)
+        try:
+            check_availability(rooms, validated_data['check_in'], validated_data['check_out'],
+                               booking_to_exclude=self.instance)
+        except CustomException as error:
+            raise CustomException({'rooms': error.detail})
 
     class Meta:
         model = Booking
         fields = ['id', 'user', 'surname', 'rooms', 'check_in', 'check_out', 'created', 'get_booking_time', 'get_booking_price']
 
 
+class BulkRoomSerializer(RoomSerializer):
+    number = serializers.IntegerField()  # uniqueness is checked for the whole batch at once, see bulk.py
+
+
+class BulkBookingSerializer(serializers.Serializer):
+    # rooms are plain numbers resolved for the whole batch at once and availability is checked for the whole
+    # batch at once (see bulk.py), instead of a query per room and per booking
+    surname = serializers.CharField(max_length=30)
+    rooms = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+
+    def validate(self, attrs):
+        check_timespan(attrs['check_in'], attrs['check_out'])
+        attrs['rooms'] = sorted(set(attrs['rooms']))
+        return attrs
+
+
 class SearchBookingSerializer(serializers.ModelSerializer):
     surname = serializers.CharField(max_length=30, required=False)
+    surname_prefix = serializers.CharField(max_length=30, required=False)
+    user = serializers.CharField(max_length=150, required=False)  # username
     rooms = serializers.ManyRelatedField(required=False,
                                          child_relation=serializers.PrimaryKeyRelatedField(queryset=Room.objects.all()))
     check_in = serializers.DateField(required=False)
     check_out = serializers.DateField(required=False)
     created = serializers.DateTimeField(required=False)  # API and Frontend search accepts Date in format '%Y-%m-%d'
+    active_from = serializers.DateField(required=False)  # bookings lasting at least a part of the period
+    active_to = serializers.DateField(required=False)
+    price_min = serializers.IntegerField(required=False, min_value=0)
+    price_max = serializers.IntegerField(required=False, min_value=0)
 
     # because of required = False, always SkipField exception occured and functions like validate_check_in
     # were never called, so everything is in validate() function
@@ -68,9 +171,75 @@ class SearchBookingSerializer(serializers.ModelSerializer):
                 datetime.strptime(params['created'], '%Y-%m-%d')
             except:
                 raise ValidationError('created has to be in format %Y-%m-%d')
+        active = {}
+        for key in ['active_from', 'active_to']:
+            if key in params:
+                try:
+                    active[key] = datetime.strptime(params[key], '%Y-%m-%d')
+                except:
+                    raise ValidationError(f'{key} has to be in format %Y-%m-%d')
+        if len(active) == 2 and active['active_from'] > active['active_to']:
+            raise ValidationError('active_from has to be before active_to')
+        for price in ['price_min', 'price_max']:
+            if price in params and not params[price].isdigit():
+                raise ValidationError(f'{price} can be non-negative integer only')
         return attrs
 
     class Meta:
         model = Booking
-        fields = ['surname', 'rooms', 'check_in', 'check_out', 'created']
+        fields = ['surname', 'surname_prefix', 'user', 'rooms', 'check_in', 'check_out', 'created', 'active_from',
+                  'active_to', 'price_min', 'price_max']
+
+
+class AvailabilitySerializer(serializers.Serializer):
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    category = serializers.CharField(required=False)  # accepts both category name ('A') and its number (1)
+
+    def validate_category(self, value):
+        categories = {str(number): number for number, name in ROOM_CATEGORIES}
+        categories.update({name: number for number, name in ROOM_CATEGORIES})
+        if value.upper() not in categories:
+            raise ValidationError(f'category has to be one of {", ".join(name for _, name in ROOM_CATEGORIES)}')
+        return categories[value.upper()]
+
+    def validate(self, attrs):
+        if attrs['check_in'] >= attrs['check_out']:
+            raise ValidationError('"Check in" date should precede "Check out"')
+        return attrs
+
+
+class ReportSerializer(serializers.Serializer):
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()  # inclusive
+    period = serializers.ChoiceField(choices=['day', 'month'], default='month')
+
+    def validate(self, attrs):
+        if attrs['date_from'] > attrs['date_to']:
+            raise ValidationError('date_from should not be after date_to')
+        max_days = 366 if attrs['period'] == 'day' else 366 * 10
+        if (attrs['date_to'] - attrs['date_from']).days >= max_days:
+            raise ValidationError(f'{attrs["period"]} report can span at most {max_days} days')
+        return attrs
+
+
+class CalendarSerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)  # today by default
+    date_to = serializers.DateField(required=False)  # inclusive, 30 days after date_from by default
+
+    def validate(self, attrs):
+        attrs.setdefault('date_from', date.today())
+        attrs.setdefault('date_to', attrs['date_from'] + timedelta(days=30))
+        if attrs['date_from'] > attrs['date_to']:
+            raise ValidationError('date_from should not be after date_to')
+        if (attrs['date_to'] - attrs['date_from']).days >= 366:
+            raise ValidationError('calendar can span at most 366 days')
+        return attrs
+
+
+class NightSerializer(serializers.Serializer):
+    date = serializers.DateField()  # the night from date to the next day
+
 
+class ExportSerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')  # not 'format', DRF uses it
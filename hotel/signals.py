@@ -0,0 +1,149 @@
+from django.contrib.auth.models import User, Group
+from rest_framework.authtoken.models import Token
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import Room, Booking, RoomReservation, RoomNight, RoomRate, SeasonalRate
+from .caching import bump_table_versions
+from .sqlite import apply_pragmas
+from .authentication import forget_tokens
+from .permissions import forget_user_groups
+from .locking import lock_rooms_for_update
+from .occupancy import refresh_occupancy, stay_nights
+from .pricing import forget_seasonal_rates, forget_room_rates
+
+# keeps RoomReservation (interval index), RoomNight (booked nights used by check_availability) and RoomOccupancy
+# (calendar bitmaps) in sync with Booking, nights of a booking are deleted before new ones are inserted, so that
+# a booking moved by a few days does not collide with its own old nights
+
+
+@receiver(post_save, sender=Booking)
+def sync_reservation_dates(sender, instance, **kwargs):
+    stays = list(RoomReservation.objects.filter(booking=instance).values_list('room', 'check_in', 'check_out'))
+    if all((check_in, check_out) == (instance.check_in, instance.check_out) for _, check_in, check_out in stays):
+        return  # new booking (no rooms yet) or dates not changed
+    RoomReservation.objects.filter(booking=instance).update(check_in=instance.check_in, check_out=instance.check_out)
+    RoomNight.objects.filter(booking=instance).delete()
+    RoomNight.objects.bulk_create([night for room, _, _ in stays
+                                   for night in stay_nights(instance.pk, room, instance.check_in, instance.check_out)])
+    refresh_occupancy(stays + [(room, instance.check_in, instance.check_out) for room, _, _ in stays])
+
+
+@receiver(m2m_changed, sender=Booking.rooms.through)
+def sync_reservation_rooms(sender, instance, action, reverse, pk_set, **kwargs):
+    # reverse=False - instance is a Booking and pk_set are room numbers
+    # reverse=True - instance is a Room and pk_set are booking ids (room.booking_set.add(...))
+    if action == 'post_add':
+        bookings = Booking.objects.filter(pk__in=pk_set) if reverse else [instance]
+        rooms = [instance.pk] if reverse else pk_set
+        reservations = [RoomReservation(booking_id=booking.pk, room_id=room, check_in=booking.check_in,
+                                        check_out=booking.check_out) for booking in bookings for room in rooms]
+        RoomReservation.objects.bulk_create(reservations)
+        RoomNight.objects.bulk_create([night for x in reservations
+                                       for night in stay_nights(x.booking_id, x.room_id, x.check_in, x.check_out)])
+        refresh_occupancy([(x.room_id, x.check_in, x.check_out) for x in reservations])
+    elif action in ('post_remove', 'post_clear'):
+        removed = {'room': instance} if reverse else {'booking': instance}
+        if action == 'post_remove':
+            removed['booking__in' if reverse else 'room__in'] = pk_set
+        stays = list(RoomReservation.objects.filter(**removed).values_list('room', 'check_in', 'check_out'))
+        RoomReservation.objects.filter(**removed).delete()
+        RoomNight.objects.filter(**removed).delete()
+        refresh_occupancy(stays)
+
+
+@receiver(pre_delete, sender=Booking)
+def lock_deleted_booking_rooms(sender, instance, **kwargs):
+    # reservations and nights are deleted by the cascade, refresh_deleted_booking_bitmaps runs afterwards
+    instance.deleted_stays = list(instance.reservations.values_list('room', 'check_in', 'check_out'))
+    if instance.deleted_stays:
+        lock_rooms_for_update({room for room, _, _ in instance.deleted_stays})
+
+
+@receiver(post_delete, sender=Booking)
+def refresh_deleted_booking_bitmaps(sender, instance, **kwargs):
+    refresh_occupancy(getattr(instance, 'deleted_stays', []))
+
+
+# invalidates group membership cached by permissions.get_user_groups
+
+@receiver(post_save, sender=User)
+def forget_new_user_groups(sender, instance, created, **kwargs):
+    if created:  # ids can be reused (e.g. rolled back transactions), never inherit a cached entry
+        forget_user_groups([instance.id])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def forget_changed_user_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    # reverse=False - instance is a User, reverse=True - instance is a Group and pk_set are user ids
+    if action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        forget_user_groups([instance.id])
+    elif action in ('post_add', 'post_remove') and reverse:
+        forget_user_groups(pk_set)
+    elif action == 'pre_clear' and reverse:
+        forget_user_groups(instance.user_set.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Group)  # group renamed
+@receiver(pre_delete, sender=Group)
+def forget_group_members(sender, instance, **kwargs):
+    if instance.pk is not None:
+        forget_user_groups(instance.user_set.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=SeasonalRate)
+@receiver(post_delete, sender=SeasonalRate)
+def forget_changed_seasonal_rates(sender, **kwargs):
+    forget_seasonal_rates()
+
+
+@receiver(post_save, sender=RoomRate)
+@receiver(post_delete, sender=RoomRate)
+def forget_changed_room_rates(sender, **kwargs):
+    forget_room_rates()
+
+
+# invalidates responses cached by caching.CachedResponseMixin
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def bump_room_version(sender, **kwargs):
+    bump_table_versions('room')
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(m2m_changed, sender=Booking.rooms.through)
+def bump_booking_version(sender, action=None, **kwargs):
+    if action is None or action in ('post_add', 'post_remove', 'post_clear'):
+        bump_table_versions('booking')
+
+
+@receiver(post_save, sender=SeasonalRate)  # prices of bookings
+@receiver(post_delete, sender=SeasonalRate)
+def bump_seasonal_rate_version(sender, **kwargs):
+    bump_table_versions('seasonalrate')
+
+
+@receiver(post_save, sender=RoomRate)  # prices of bookings
+@receiver(post_delete, sender=RoomRate)
+def bump_room_rate_version(sender, **kwargs):
+    bump_table_versions('roomrate')
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    apply_pragmas(connection)
+
+
+# invalidates token-to-user lookups cached by authentication.CachedTokenAuthentication
+
+@receiver(post_delete, sender=Token)  # logout, expiry, deleted user
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)  # e.g. deactivated user
+def forget_changed_user_tokens(sender, instance, created, **kwargs):
+    if not created:
+        forget_tokens(Token.objects.filter(user=instance).values_list('key', flat=True))
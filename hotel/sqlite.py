@@ -0,0 +1,14 @@
+from django.conf import settings
+
+# SQLite production mode - every new connection gets settings.SQLITE_PRAGMAS (see signals.py):
+# busy_timeout makes writers wait for the lock instead of failing right away, with DJANGO_HOTEL_SQLITE_WAL
+# also WAL, which lets readers work while a booking is being written, and synchronous=NORMAL, which is durable
+# enough with WAL and syncs much less
+
+
+def apply_pragmas(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
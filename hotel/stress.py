@@ -0,0 +1,90 @@
+import threading
+import time
+from django.db import connections
+from django.test.client import ClientHandler, RequestFactory
+
+# fires booking POSTs from many threads at once, every thread has its own database connection, so requests
+# really run in parallel transactions (used by tests and the stress_bookings and load_bookings commands)
+# requests go straight through the WSGI handler like in gunicorn - django.test.Client is not used, because it
+# re-raises exceptions of every thread in whichever thread is currently waiting for a response
+
+
+def post_bookings_concurrently(payloads, headers, workers=8):
+    """
+    Posts every payload to /api/bookings/ using `workers` threads.
+    Returns dict with numbers of created (201), rejected (400) and failed (e.g. 500 on database locks) requests,
+    elapsed seconds and created bookings per second.
+    """
+    stats = {'requests': len(payloads), 'created': 0, 'rejected': 0, 'failed': 0}
+    lock = threading.Lock()
+    start = threading.Barrier(workers + 1)
+
+    def worker(chunk):
+        handler = ClientHandler()
+        factory = RequestFactory()
+        start.wait()
+        try:
+            for payload in chunk:
+                environ = factory.post('/api/bookings/', data=payload, **headers).environ
+                status = handler(environ).status_code
+                with lock:
+                    stats[{201: 'created', 400: 'rejected'}.get(status, 'failed')] += 1
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(payloads[i::workers],)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    stats['created_per_second'] = round(stats['created'] / stats['seconds'], 1) if stats['seconds'] else None
+    return stats
+
+
+def post_bookings_sustained(make_payload, headers, seconds=10, workers=8):
+    """
+    Posts make_payload(worker, n) to /api/bookings/ from `workers` threads until `seconds` run out.
+    Returns the same stats as post_bookings_concurrently(), plus created bookings in every whole second
+    (the sustained rate is the lowest and the median of them, not just the average).
+    """
+    stats = {'requests': 0, 'created': 0, 'rejected': 0, 'failed': 0}
+    per_second = [0] * seconds
+    lock = threading.Lock()
+    start = threading.Barrier(workers + 1)
+    times = {}
+
+    def worker(number):
+        handler = ClientHandler()
+        factory = RequestFactory()
+        start.wait()
+        try:
+            n = 0
+            while time.perf_counter() < times['end']:
+                environ = factory.post('/api/bookings/', data=make_payload(number, n), **headers).environ
+                status = handler(environ).status_code
+                second = int(time.perf_counter() - times['start'])
+                with lock:
+                    stats['requests'] += 1
+                    stats[{201: 'created', 400: 'rejected'}.get(status, 'failed')] += 1
+                    if status == 201 and second < seconds:
+                        per_second[second] += 1
+                n += 1
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(workers)]
+    for thread in threads:
+        thread.start()
+    times['start'] = time.perf_counter()
+    times['end'] = times['start'] + seconds
+    start.wait()
+    for thread in threads:
+        thread.join()
+    stats['seconds'] = round(time.perf_counter() - times['start'], 3)
+    stats['created_per_second'] = round(stats['created'] / stats['seconds'], 1)
+    stats['created_per_second_min'] = min(per_second)
+    stats['created_per_second_median'] = sorted(per_second)[seconds // 2]
+    return stats
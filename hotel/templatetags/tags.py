@@ -1,15 +1,16 @@
 from django import template
 from django.contrib.auth.models import User
+from hotel.permissions import get_user_groups
 
 register = template.Library()
 
 @property
 def is_hotel_client(self):
-    return self.groups.filter(name='Client').exists()
+    return 'Client' in get_user_groups(self)
 
 @property
 def is_hotel_staff(self):  # to not be confused with django .is_staff
-    return self.groups.filter(name='Staff').exists()
+    return 'Staff' in get_user_groups(self)
 
 
 setattr(User, 'is_hotel_client', is_hotel_client)
@@ -1,9 +1,33 @@
 from django.contrib.auth.models import User, Group
-from django.test import TestCase, Client
-from .models import Booking, Room
+from rest_framework.authtoken.models import Token
+from django.core.cache import cache
+from django.core.wsgi import get_wsgi_application
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, Client, RequestFactory, override_settings
+from django.conf import settings
+from django.db import connection, transaction, IntegrityError, OperationalError
+from django.utils import timezone
+from .models import Booking, Room, RoomReservation, RoomNight, RoomOccupancy, SeasonalRate, RoomRate
+from .config import ROOM_PRICES
+from .pricing import get_seasonal_rates, forget_seasonal_rates, get_room_rates, forget_room_rates
+from .validations import check_availability, find_overlaps, CustomException
+from .permissions import is_in_group
+from .stress import post_bookings_concurrently
+from .benchmark import seed_bookings, benchmark_api, asgi_get
+from .asynchronous import HotelASGIApplication
+from .caching import bump_table_versions, TABLE_VERSION_CACHE_TIMEOUT
+from .locking import retry_on_locked, LOCKED_RETRY_ATTEMPTS
+from .metrics import registry, find_repeated_queries, request_queries, MetricsMiddleware
+from .occupancy import occupancy_grid, rebuild_occupancy, rebuild_room_nights
+from .availability import available_rooms
+from collections import deque
 from datetime import datetime
 from json import dumps, loads
+import asyncio
+import time
 import base64
+from unittest import mock, skipUnless
+from urllib.parse import urlparse, parse_qs
 
 # codes cheatsheet
 # 200 - OK
@@ -42,7 +66,7 @@ class RoomTest(TestCase):
         Room.objects.create(number=103, category=4)
         response = self.client.get('/api/rooms/')
         self.assertEqual(response.status_code, 200)  # OK
-        self.assertEqual(len(loads(response.content)), 3)
+        self.assertEqual(len(loads(response.content)['results']), 3)
 
     def test_client_not_auth_add_room(self):
         response = self.client.post('/api/rooms/', data={"number": 101, "category": 1})
@@ -111,7 +135,7 @@ class BookingSimpleTest(TestCase):
         create_booking(2, self.user_staff, 'Staff', [self.room_101], '3021-09-05', '3021-09-06')
         response = self.client.get('/api/bookings/')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(loads(response.content)), 2)  # loads (dict) or response.data (objects)
+        self.assertEqual(len(loads(response.content)['results']), 2)  # loads (dict) or response.data (objects)
 
     def test_client_not_auth_add_booking(self):
         data = {"user": self.user_client.id, "surname": "user_client", "rooms": [101], "check_in": "3021-09-15",
@@ -211,6 +235,17 @@ class BookingAdvancedTest(TestCase):
         self.assertEqual(response.status_code, 400)  # Bad Request
         self.assertEqual(loads(response.content)['rooms'], '"Check in" date should precede "Check out"')
 
+    def test_bookings_post_unknown_room(self):
+        data = {"surname": "Staff", "rooms": [101, 999], "check_in": "3021-09-13", "check_out": "3021-09-15"}
+        response = self.client.post('/api/bookings/', data=dumps(data), content_type='application/json',
+                                    **self.s_headers)
+        self.assertEqual(response.status_code, 400)  # Bad Request
+        self.assertEqual(loads(response.content)['rooms'], ['Invalid pk "999" - object does not exist.'])
+        data['rooms'] = ['a']
+        response = self.client.post('/api/bookings/', data=dumps(data), content_type='application/json',
+                                    **self.s_headers)
+        self.assertEqual(loads(response.content)['rooms'], ['Incorrect type. Expected pk value, received str.'])
+
     def test_bookings_update_single_extending(self):
         create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-09-01', '3021-09-05')
         data = {"user": self.user_staff.id, "surname": "Staff", "rooms": [101], "check_in": "3021-09-01",
@@ -220,6 +255,907 @@ class BookingAdvancedTest(TestCase):
         self.assertEqual(response.status_code, 200)  # OK
 
 
+class RoomReservationTest(TestCase):
+    def setUp(self):
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.room_101 = Room.objects.create(number=101, category=1)
+        self.room_102 = Room.objects.create(number=102, category=1)
+
+    def test_reservations_follow_booking(self):
+        booking = create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-09-01', '3021-09-03')
+        self.assertEqual(list(RoomReservation.objects.values_list('room', 'check_in')),
+                         [(101, datetime(3021, 9, 1).date())])
+        booking.rooms.set([self.room_102])
+        booking.check_in = datetime(3021, 9, 2).date()
+        booking.save()
+        self.assertEqual(list(RoomReservation.objects.values_list('room', 'check_in')),
+                         [(102, datetime(3021, 9, 2).date())])
+        booking.delete()
+        self.assertFalse(RoomReservation.objects.exists())
+
+    def test_check_availability_single_query(self):
+        create_booking(1, self.user_staff, 'Staff', [self.room_102], '3021-09-05', '3021-09-08')
+        with self.assertNumQueries(1):
+            check_availability([self.room_101, self.room_102], '3021-09-01', '3021-09-04')
+        with self.assertNumQueries(1), self.assertRaises(CustomException):
+            check_availability([self.room_101, self.room_102], '3021-09-01', '3021-09-05')
+
+    def test_overlapping_reservations(self):
+        create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-09-05', '3021-09-08')
+        day = lambda x: datetime(3021, 9, x).date()
+        self.assertFalse(RoomReservation.objects.overlapping(day(1), day(4)).exists())
+        self.assertTrue(RoomReservation.objects.overlapping(day(1), day(5)).exists())  # edge days overlap
+        self.assertTrue(RoomReservation.objects.overlapping(day(6), day(7)).exists())
+        self.assertTrue(RoomReservation.objects.overlapping(day(8), day(10)).exists())
+        self.assertFalse(RoomReservation.objects.overlapping(day(9), day(10)).exists())
+
+    def test_nights_follow_booking(self):
+        booking = create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-09-01', '3021-09-03')
+        nights = lambda: list(RoomNight.objects.order_by('room', 'date').values_list('room', 'date'))
+        self.assertEqual(nights(), [(101, datetime(3021, 9, 1).date()), (101, datetime(3021, 9, 2).date())])
+        booking.rooms.add(self.room_102)
+        booking.check_in = datetime(3021, 9, 2).date()
+        booking.save()
+        self.assertEqual(nights(), [(101, datetime(3021, 9, 2).date()), (102, datetime(3021, 9, 2).date())])
+        booking.rooms.remove(self.room_101)
+        self.assertEqual(nights(), [(102, datetime(3021, 9, 2).date())])
+        RoomNight.objects.all().delete()
+        self.assertEqual(rebuild_room_nights(), 1)
+        booking.delete()
+        self.assertFalse(RoomNight.objects.exists())
+
+    def test_rebuild_room_nights_batches(self):
+        create_booking(1, self.user_staff, 'Staff', [self.room_101, self.room_102], '3021-09-01', '3021-09-04')
+        create_booking(2, self.user_staff, 'Staff', [self.room_101], '3021-09-10', '3021-09-12')
+        nights = list(RoomNight.objects.order_by('room', 'date').values_list('booking', 'room', 'date'))
+        with mock.patch('hotel.occupancy.NIGHTS_BATCH_SIZE', 2):
+            self.assertEqual(rebuild_room_nights(), 8)
+        self.assertEqual(list(RoomNight.objects.order_by('room', 'date').values_list('booking', 'room', 'date')),
+                         nights)
+
+    def test_shared_night_refused(self):
+        create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-09-05', '3021-09-08')
+        booking = create_booking(2, self.user_staff, 'Staff', [self.room_102], '3021-09-07', '3021-09-10')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            booking.rooms.add(self.room_101)  # bypasses check_availability, the unique night refuses it anyway
+
+    def test_put_moves_to_room_booked_by_old_room(self):
+        # the old room (101) is taken on the new dates, the new room (102) is free
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        group_staff.user_set.add(self.user_staff)
+        headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'user_staff:password').decode("ascii")}
+        create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-01-01', '3021-01-03')
+        create_booking(2, self.user_staff, 'Other', [self.room_101], '3021-01-10', '3021-01-12')
+        data = {"surname": "Staff", "rooms": [102], "check_in": "3021-01-10", "check_out": "3021-01-12"}
+        response = self.client.put('/api/bookings/1/', data=dumps(data), content_type='application/json', **headers)
+        self.assertEqual(response.status_code, 200)  # OK
+        self.assertEqual(list(RoomNight.objects.filter(booking=1).order_by('date').values_list('room', 'date')),
+                         [(102, datetime(3021, 1, 10).date()), (102, datetime(3021, 1, 11).date())])
+        self.assertEqual(list(RoomReservation.objects.filter(booking=1).values_list('room', 'check_in')),
+                         [(102, datetime(3021, 1, 10).date())])
+
+    def test_admin_overlapping_booking(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-01-01', '3021-01-03')
+        create_booking(2, self.user_staff, 'Other', [self.room_101], '3021-01-10', '3021-01-12')
+        data = {'user': self.user_staff.id, 'surname': 'Staff', 'rooms': [101], 'check_in': '3021-01-10',
+                'check_out': '3021-01-12'}
+        response = self.client.post('/admin/hotel/booking/1/change/', data)
+        self.assertEqual(response.status_code, 200)  # form shown again with the error
+        self.assertIn('At least one of selected rooms is booked', response.content.decode())
+        data['rooms'] = [102]
+        response = self.client.post('/admin/hotel/booking/1/change/', data)
+        self.assertEqual(response.status_code, 302)  # Found (Redirected)
+        self.assertEqual(list(RoomNight.objects.filter(booking=1).values_list('room', flat=True)), [102, 102])
+
+    @skipUnless(connection.vendor == 'postgresql', 'exclusion constraint exists on PostgreSQL only')
+    def test_exclusion_constraint(self):
+        create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-09-05', '3021-09-08')
+        booking = create_booking(2, self.user_staff, 'Staff', [self.room_102], '3021-09-08', '3021-09-10')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            booking.rooms.add(self.room_101)  # bypasses check_availability, the database refuses it anyway
+
+
+class AvailabilityTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.room_101 = Room.objects.create(number=101, category=1)
+        self.room_102 = Room.objects.create(number=102, category=1)
+        self.room_103 = Room.objects.create(number=103, category=4)
+        create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-09-01', '3021-09-03')
+
+    def test_anon_get_free_rooms(self):
+        response = self.client.get('/api/availability/', {'check_in': '3021-09-02', 'check_out': '3021-09-05'})
+        self.assertEqual(response.status_code, 200)  # OK
+        self.assertEqual([room['number'] for room in loads(response.content)], [102, 103])
+
+    def test_get_free_rooms_by_category(self):
+        response = self.client.get('/api/availability/', {'check_in': '3021-09-04', 'check_out': '3021-09-05',
+                                                          'category': 'A'})
+        self.assertEqual([room['number'] for room in loads(response.content)], [101, 102])
+
+    def test_get_free_rooms_wrong_params(self):
+        response = self.client.get('/api/availability/', {'check_in': '3021-09-05', 'check_out': '3021-09-04'})
+        self.assertEqual(response.status_code, 400)  # Bad Request
+        response = self.client.get('/api/availability/', {'check_in': '3021-09-04', 'check_out': '3021-09-05',
+                                                          'category': 'X'})
+        self.assertEqual(response.status_code, 400)  # Bad Request
+
+
+@override_settings(HOTEL_AVAILABILITY_CACHE=True)
+class AvailabilityCacheTest(TransactionTestCase):
+    # TestCase runs in a transaction, where the snapshot is never used
+    def setUp(self):
+        cache.clear()  # table versions of previous tests
+        self.client = Client()
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.room_101 = Room.objects.create(number=101, category=1)
+        self.room_102 = Room.objects.create(number=102, category=4)
+        create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-12-30', '3022-01-02')
+
+    def test_same_as_database(self):
+        day = lambda x: datetime.strptime(x, "%Y-%m-%d").date()
+        for check_in, check_out in [('3021-12-20', '3021-12-29'), ('3021-12-20', '3021-12-30'),
+                                    ('3022-01-02', '3022-01-05'), ('3022-01-03', '3022-01-05'),
+                                    ('3021-12-31', '3021-12-31')]:
+            rooms = [room.number for room in available_rooms(day(check_in), day(check_out))]
+            expected = Room.objects.available_between(day(check_in), day(check_out)).order_by('number')
+            self.assertEqual(rooms, [room.number for room in expected], (check_in, check_out))
+
+    def test_answers_from_memory(self):
+        self.client.get('/api/availability/', {'check_in': '3021-12-20', 'check_out': '3021-12-25'})
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/availability/', {'check_in': '3021-12-20', 'check_out': '3021-12-30'})
+            with self.assertRaises(CustomException):
+                check_availability([self.room_101], '3021-12-25', '3021-12-30', cached=True)
+        self.assertEqual(loads(response.content), [{'number': 102, 'category': 4}])
+
+    def test_follows_bookings(self):
+        available_rooms(datetime(3021, 12, 20).date(), datetime(3021, 12, 25).date())
+        booking = create_booking(2, self.user_staff, 'Staff', [self.room_102], '3021-12-24', '3021-12-26')
+        self.assertEqual(available_rooms(datetime(3021, 12, 20).date(), datetime(3021, 12, 22).date()),
+                         [self.room_101, self.room_102])
+        self.assertEqual(available_rooms(datetime(3021, 12, 20).date(), datetime(3021, 12, 24).date()),
+                         [self.room_101])
+        booking.delete()
+        self.assertEqual(available_rooms(datetime(3021, 12, 20).date(), datetime(3021, 12, 24).date()),
+                         [self.room_101, self.room_102])
+
+
+class BookingQueryCountTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        group_staff.user_set.add(self.user_staff)
+        self.room_101 = Room.objects.create(number=101, category=1)
+        self.room_102 = Room.objects.create(number=102, category=4)
+        for i in range(1, 21):
+            create_booking(i, self.user_staff, 'Staff', [self.room_101, self.room_102],
+                           f'{3021 + i // 12}-{i % 12 + 1:02d}-01', f'{3021 + i // 12}-{i % 12 + 1:02d}-03')
+
+    def test_booking_price_annotations(self):
+        booking = Booking.objects.with_details().get(id=1)
+        self.assertEqual(booking.get_booking_time(), 2)
+        self.assertEqual(booking.get_booking_price(), 2 * (200 + 50))
+        self.assertEqual(booking.get_booking_price(), Booking.objects.get(id=1).get_booking_price())
+
+    def test_seasonal_booking_price(self):
+        # booking 1 is 3021-02-01 to 3021-02-03 in rooms of class A and D, only the night of 02-02 is in season
+        SeasonalRate.objects.create(category=1, start=datetime(3021, 2, 2).date(), end=datetime(3021, 2, 10).date(),
+                                    price=300)
+        self.assertEqual(Booking.objects.get(id=1).get_booking_price(), 200 + 300 + 2 * 50)
+        prices = Booking.objects.with_price().order_by('-price', 'id').values_list('id', 'price')
+        self.assertEqual(prices[0], (1, 600))
+
+    def test_api_bookings_query_count(self):
+        forget_seasonal_rates()
+        forget_room_rates()
+        with self.assertNumQueries(4):  # room and seasonal rates + bookings with user, nights and price + rooms
+            self.client.get('/api/bookings/')
+        bump_table_versions('booking')  # cached response (caching.py) is stale now
+        with self.assertNumQueries(2):  # rates are cached now
+            response = self.client.get('/api/bookings/')
+        self.assertEqual(len(loads(response.content)['results']), 20)
+        with self.assertNumQueries(0):  # the whole response is cached
+            response = self.client.get('/api/bookings/')
+        self.assertEqual(len(loads(response.content)['results']), 20)
+
+    def test_api_post_query_count(self):
+        Room.objects.bulk_create([Room(number=number, category=1) for number in range(201, 211)])
+        headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'user_staff:password').decode("ascii")}
+        data = {"surname": "Group", "rooms": list(range(201, 211)), "check_in": "3021-09-05", "check_out": "3021-09-07"}
+        get_seasonal_rates()
+        get_room_rates()
+        is_in_group(self.user_staff, 'Staff')  # groups of the user are cached
+        # rooms are resolved by one query and checked by one query, the booking is validated once, then locked,
+        # checked again, saved and loaded for the response in one transaction - none of it repeats per room
+        with self.assertNumQueries(19):
+            response = self.client.post('/api/bookings/', data=dumps(data), content_type='application/json', **headers)
+        self.assertEqual(response.status_code, 201)  # Created
+        self.assertEqual(len(loads(response.content)['rooms']), 10)
+        data['rooms'] = [101]
+        with self.assertNumQueries(19):
+            response = self.client.post('/api/bookings/', data=dumps(data), content_type='application/json', **headers)
+        self.assertEqual(response.status_code, 201)  # Created
+
+    def test_frontend_bookings_query_count(self):
+        get_seasonal_rates()
+        get_room_rates()
+        with self.assertNumQueries(2):
+            response = self.client.get('/bookings/')
+            response.render()
+        self.assertEqual(len(response.data['bookings']), 20)
+
+
+class RoomRateTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        group_staff.user_set.add(self.user_staff)
+        self.room_101 = Room.objects.create(number=101, category=1)
+        create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-09-01', '3021-09-03')
+
+    def test_seeded_rates(self):
+        self.assertEqual(dict(RoomRate.objects.values_list('category', 'price')), {1: 200, 2: 150, 3: 100, 4: 50})
+        self.assertEqual(get_room_rates().by_name, ROOM_PRICES)
+
+    def test_changed_rate(self):
+        get_room_rates()
+        with self.assertNumQueries(0):
+            get_room_rates()
+        rate = RoomRate.objects.get(category=1)
+        rate.price = 250
+        rate.save()
+        self.assertEqual(get_room_rates().by_number[1], 250)
+        self.assertEqual(loads(get_room_rates().json)['A'], 250)
+        self.assertEqual(Booking.objects.get(id=1).get_booking_price(), 2 * 250)
+        rate.delete()  # missing rows fall back to ROOM_PRICES
+        self.assertEqual(Booking.objects.get(id=1).get_booking_price(), 2 * ROOM_PRICES['A'])
+
+
+class CachedResponseTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        group_client, _ = Group.objects.get_or_create(name='Client')
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.user_client = User.objects.create_user('user_client', 'test.test@gmail.com', 'password')
+        self.s_headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'user_staff:password').decode("ascii")}
+        self.c_headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'user_client:password').decode("ascii")}
+        group_staff.user_set.add(self.user_staff)
+        group_client.user_set.add(self.user_client)
+        self.room_101 = Room.objects.create(number=101, category=1)
+        create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-09-01', '3021-09-03')
+
+    def test_rooms_not_modified(self):
+        response = self.client.get('/api/rooms/')
+        self.assertEqual(response.status_code, 200)  # OK
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/rooms/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)  # Not Modified
+        self.assertEqual(response.content, b'')
+
+    def test_versions_expire(self):
+        # a worker with its own (locmem) cache does not see bumps of others, its versions expire instead
+        etag = self.client.get('/api/rooms/')['ETag']
+        later = time.time() + TABLE_VERSION_CACHE_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            response = self.client.get('/api/rooms/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)  # OK
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_rooms_cache_invalidated(self):
+        etag = self.client.get('/api/rooms/')['ETag']
+        Room.objects.create(number=102, category=2)
+        response = self.client.get('/api/rooms/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)  # OK
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([x['number'] for x in loads(response.content)['results']], [101, 102])
+        response = self.client.get('/api/rooms/102/')
+        self.assertEqual(loads(response.content)['category'], 2)
+
+    def test_bookings_cache_invalidated(self):
+        self.assertEqual(loads(self.client.get('/api/bookings/1/', **self.s_headers).content)['get_booking_price'],
+                         400)
+        self.room_101.category = 4
+        self.room_101.save()
+        self.assertEqual(loads(self.client.get('/api/bookings/1/', **self.s_headers).content)['get_booking_price'],
+                         100)
+        Booking.objects.get(id=1).rooms.clear()
+        self.assertEqual(loads(self.client.get('/api/bookings/1/', **self.s_headers).content)['get_booking_price'], 0)
+
+    def test_bookings_cached_per_user(self):
+        etag = self.client.get('/api/bookings/', **self.s_headers)['ETag']
+        response = self.client.get('/api/bookings/', HTTP_IF_NONE_MATCH=etag, **self.c_headers)
+        self.assertEqual(response.status_code, 200)  # OK
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_write_not_cached(self):
+        response = self.client.post('/api/rooms/', data={'number': 103, 'category': 1}, **self.s_headers)
+        self.assertEqual(response.status_code, 201)  # Created
+        self.assertFalse(response.has_header('ETag'))
+
+
+class PaginationTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.room_101 = Room.objects.create(number=101, category=1)
+        for i in range(1, 6):
+            create_booking(i, self.user_staff, 'Staff', [self.room_101], f'3021-09-{i * 3:02d}', f'3021-09-{i * 3 + 1:02d}')
+
+    def test_bookings_cursor_pages(self):
+        response = loads(self.client.get('/api/bookings/', {'page_size': 2}).content)
+        ids = [booking['id'] for booking in response['results']]
+        while response['next']:
+            response = loads(self.client.get(response['next']).content)
+            ids += [booking['id'] for booking in response['results']]
+        self.assertEqual(ids, [5, 4, 3, 2, 1])  # newest first, no duplicates or gaps between pages
+
+    def test_cursor_pages_through_ties(self):
+        # all bookings created at once - positions include id, so no page needs an OFFSET
+        Booking.objects.update(created=timezone.make_aware(datetime(2021, 5, 4, 12, 0)))
+        response = loads(self.client.get('/api/bookings/', {'page_size': 2}).content)
+        ids, cursors = [booking['id'] for booking in response['results']], []
+        while response['next']:
+            cursors.append(base64.b64decode(parse_qs(urlparse(response['next']).query)['cursor'][0]))
+            response = loads(self.client.get(response['next']).content)
+            ids += [booking['id'] for booking in response['results']]
+        self.assertEqual(ids, [5, 4, 3, 2, 1])
+        self.assertFalse([cursor for cursor in cursors if b'o=' in cursor])
+        response = loads(self.client.get(response['previous']).content)
+        self.assertEqual([booking['id'] for booking in response['results']], [3, 2])
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/bookings/', {'cursor': base64.b64encode(b'p=nonsense').decode()})
+        self.assertEqual(response.status_code, 404)  # Not Found (invalid cursor)
+
+    def test_frontend_bookings_pages(self):
+        response = self.client.get('/bookings/', {'page_size': 2})
+        self.assertEqual(len(response.data['bookings']), 2)
+        self.assertIsNotNone(response.data['next'])
+        self.assertIsNone(response.data['previous'])
+
+
+class GroupCacheTest(TestCase):
+    def setUp(self):
+        self.group_client, _ = Group.objects.get_or_create(name='Client')
+        self.group_staff, _ = Group.objects.get_or_create(name='Staff')
+        self.user = User.objects.create_user('user_client', 'test1.test@gmail.com', 'password')
+        self.group_client.user_set.add(self.user)
+
+    def test_groups_cached_across_requests(self):
+        self.assertTrue(is_in_group(User.objects.get(id=self.user.id), 'Client'))
+        user = User.objects.get(id=self.user.id)  # like request.user in the next request
+        with self.assertNumQueries(0):
+            self.assertTrue(is_in_group(user, 'Client'))
+            self.assertFalse(is_in_group(user, 'Staff'))
+            self.assertFalse(user.is_hotel_staff)
+
+    def test_groups_cache_invalidated(self):
+        self.assertFalse(is_in_group(User.objects.get(id=self.user.id), 'Staff'))
+        self.group_staff.user_set.add(self.user)
+        self.assertTrue(is_in_group(User.objects.get(id=self.user.id), 'Staff'))
+        self.user.groups.clear()
+        self.assertFalse(is_in_group(User.objects.get(id=self.user.id), 'Client'))
+
+
+class SearchPriceTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.s_headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'user_staff:password').decode("ascii")}
+        group_staff.user_set.add(self.user_staff)
+        self.room_101 = Room.objects.create(number=101, category=1)
+        self.room_102 = Room.objects.create(number=102, category=4)
+        create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-09-01', '3021-09-03')  # 400
+        create_booking(2, self.user_staff, 'Staff', [self.room_102], '3021-09-01', '3021-09-04')  # 150
+        create_booking(3, self.user_staff, 'Staff', [self.room_101, self.room_102], '3021-09-10', '3021-09-11')  # 250
+
+    def test_search_ordered_by_price(self):
+        response = self.client.get('/api/search/', {'ordering': '-price'}, **self.s_headers)
+        self.assertEqual(response.status_code, 200)  # OK
+        self.assertEqual([x['get_booking_price'] for x in loads(response.content)['results']], [400, 250, 150])
+        response = loads(self.client.get('/api/search/', {'ordering': 'price', 'page_size': 1}, **self.s_headers).content)
+        prices = [x['get_booking_price'] for x in response['results']]
+        while response['next']:
+            response = loads(self.client.get(response['next'], **self.s_headers).content)
+            prices += [x['get_booking_price'] for x in response['results']]
+        self.assertEqual(prices, [150, 250, 400])
+
+    def test_search_price_range(self):
+        response = self.client.get('/api/search/', {'price_min': 200, 'price_max': 300}, **self.s_headers)
+        self.assertEqual([x['id'] for x in loads(response.content)['results']], [3])
+
+    def test_search_wrong_price(self):
+        response = self.client.get('/api/search/', {'price_min': 'cheap'}, **self.s_headers)
+        self.assertEqual(response.status_code, 400)  # Bad Request
+
+
+class SearchFilterTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.s_headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'user_staff:password').decode("ascii")}
+        group_staff.user_set.add(self.user_staff)
+        self.room_101 = Room.objects.create(number=101, category=1)
+        self.room_102 = Room.objects.create(number=102, category=4)
+        self.room_103 = Room.objects.create(number=103, category=2)
+        create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-09-01', '3021-09-03')
+        create_booking(2, self.user_staff, 'Staff', [self.room_101, self.room_102], '3021-09-05', '3021-09-08')
+        create_booking(3, self.user_staff, 'Staff', [self.room_101, self.room_102, self.room_103], '3021-09-10',
+                       '3021-09-11')
+
+    def search(self, **params):
+        response = self.client.get('/api/search/', params, **self.s_headers)
+        self.assertEqual(response.status_code, 200)  # OK
+        return sorted(x['id'] for x in loads(response.content)['results'])
+
+    def test_search_all_rooms(self):
+        self.assertEqual(self.search(rooms='101'), [1, 2, 3])
+        self.assertEqual(self.search(rooms='101,102'), [2, 3])
+        self.assertEqual(self.search(rooms='103,101,102'), [3])
+        self.assertEqual(self.search(rooms='102,102'), [2, 3])
+
+    def test_search_all_rooms_single_query(self):
+        query = str(Booking.objects.with_rooms([101, 102]).query)
+        self.assertNotIn('DISTINCT', query)
+        self.assertIn('HAVING', query)
+
+    def test_search_created(self):
+        Booking.objects.filter(id=2).update(created=timezone.make_aware(datetime(2021, 5, 4, 23, 59)))
+        Booking.objects.filter(id=3).update(created=timezone.make_aware(datetime(2021, 5, 5, 0, 0)))
+        self.assertEqual(self.search(created='2021-05-04'), [2])
+        self.assertEqual(self.search(created='2021-05-05'), [3])
+
+    def test_search_active_between(self):
+        self.assertEqual(self.search(active_from='3021-09-03', active_to='3021-09-05'), [1, 2])
+        self.assertEqual(self.search(active_from='3021-09-09'), [3])
+        self.assertEqual(self.search(active_to='3021-09-04'), [1])
+        self.assertEqual(self.search(active_from='3021-09-06', active_to='3021-09-06', rooms='102'), [2])
+
+    def test_search_wrong_active_period(self):
+        response = self.client.get('/api/search/', {'active_from': '3021-09-05', 'active_to': '3021-09-03'},
+                                   **self.s_headers)
+        self.assertEqual(response.status_code, 400)  # Bad Request
+
+
+class ReportTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.s_headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'user_staff:password').decode("ascii")}
+        group_staff.user_set.add(self.user_staff)
+        self.room_101 = Room.objects.create(number=101, category=1)
+        self.room_102 = Room.objects.create(number=102, category=4)
+        # 2 nights in August and 1 in September
+        create_booking(1, self.user_staff, 'Staff', [self.room_101, self.room_102], '2021-08-30', '2021-09-02')
+
+    def test_monthly_revenue(self):
+        response = self.client.get('/api/reports/revenue/', {'date_from': '2021-08-01', 'date_to': '2021-09-30'},
+                                   **self.s_headers)
+        self.assertEqual(response.status_code, 200)  # OK
+        results = loads(response.content)['results']
+        self.assertEqual([x['revenue'] for x in results], [2 * 250, 250])
+        self.assertEqual(results[0]['categories']['A'], 400)
+
+    def test_daily_occupancy(self):
+        response = self.client.get('/api/reports/occupancy/', {'date_from': '2021-08-31', 'date_to': '2021-09-02',
+                                                               'period': 'day'}, **self.s_headers)
+        results = loads(response.content)['results']
+        self.assertEqual([x['occupancy'] for x in results], [1.0, 1.0, 0.0])
+        self.assertEqual(results[0]['categories']['A']['room_nights'], 1)
+
+    def test_closed_periods_cached(self):
+        params = {'date_from': '2021-08-01', 'date_to': '2021-09-30'}
+        self.client.get('/api/reports/revenue/', params, **self.s_headers)
+        with self.assertNumQueries(2):  # only authentication and rooms per category, both months are cached
+            self.client.get('/api/reports/occupancy/', params, **self.s_headers)
+
+    def test_closed_periods_follow_changes(self):
+        params = {'date_from': '2021-08-01', 'date_to': '2021-09-30'}
+        self.client.get('/api/reports/revenue/', params, **self.s_headers)
+        SeasonalRate.objects.create(category=4, start=datetime(2021, 8, 31).date(), end=datetime(2021, 9, 1).date(),
+                                    price=80)
+        results = loads(self.client.get('/api/reports/revenue/', params, **self.s_headers).content)['results']
+        self.assertEqual([x['revenue'] for x in results], [200 + 50 + 200 + 80, 200 + 80])
+        Booking.objects.get(id=1).delete()
+        results = loads(self.client.get('/api/reports/revenue/', params, **self.s_headers).content)['results']
+        self.assertEqual([x['revenue'] for x in results], [0, 0])
+
+    def test_open_periods_single_query(self):
+        create_booking(2, self.user_staff, 'Staff', [self.room_101], '3021-08-30', '3021-09-02')
+        params = {'date_from': '3021-08-01', 'date_to': '3021-10-31', 'period': 'day'}
+        get_seasonal_rates()
+        get_room_rates()
+        is_in_group(self.user_staff, 'Staff')  # groups of the user are cached
+        with self.assertNumQueries(3):  # authentication, rooms per category, nights of all 92 days
+            response = self.client.get('/api/reports/occupancy/', params, **self.s_headers)
+        results = loads(response.content)['results']
+        self.assertEqual(len(results), 92)
+        self.assertEqual([x['room_nights'] for x in results[29:33]], [1, 1, 1, 0])
+
+    def test_client_not_allowed(self):
+        response = self.client.get('/api/reports/revenue/', {'date_from': '2021-08-01', 'date_to': '2021-09-30'})
+        self.assertEqual(response.status_code, 401)  # Unauthorized
+
+
+class CalendarTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.s_headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'user_staff:password').decode("ascii")}
+        group_staff.user_set.add(self.user_staff)
+        self.room_101 = Room.objects.create(number=101, category=1)
+        self.room_102 = Room.objects.create(number=102, category=4)
+        # nights of 30th and 31st December and 1st January
+        self.booking = create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-12-30', '3022-01-02')
+
+    def nights(self):
+        day = lambda x: datetime.strptime(x, "%Y-%m-%d").date()
+        return dict(occupancy_grid(day('3021-12-29'), day('3022-01-02')))
+
+    def test_bitmaps_follow_bookings(self):
+        self.assertEqual(self.nights(), {101: '01110', 102: '00000'})
+        self.assertEqual(RoomOccupancy.objects.count(), 2)  # both years of room 101
+        self.booking.rooms.add(self.room_102)
+        self.booking.check_out = datetime(3021, 12, 31).date()
+        self.booking.save()
+        self.assertEqual(self.nights(), {101: '01000', 102: '01000'})
+        self.booking.rooms.remove(self.room_101)
+        self.assertEqual(self.nights(), {101: '00000', 102: '01000'})
+        self.booking.delete()
+        self.assertFalse(RoomOccupancy.objects.exists())
+
+    def test_rebuild(self):
+        create_booking(2, self.user_staff, 'Staff', [self.room_102], '3021-12-29', '3021-12-31')
+        RoomOccupancy.objects.all().delete()
+        self.assertEqual(rebuild_occupancy(), 3)
+        self.assertEqual(self.nights(), {101: '01110', 102: '11000'})
+
+    def test_calendar_api(self):
+        with self.assertNumQueries(2):  # bitmaps and rooms, whatever the number of days and bookings
+            self.nights()
+        response = self.client.get('/api/calendar/', {'date_from': '3021-12-31', 'date_to': '3022-01-01'},
+                                   **self.s_headers)
+        self.assertEqual(response.status_code, 200)  # OK
+        self.assertEqual(loads(response.content)['rooms'], [{'number': 101, 'nights': '11'},
+                                                            {'number': 102, 'nights': '00'}])
+        response = self.client.get('/api/calendar/', {'date_from': '3021-01-01', 'date_to': '3022-01-02'},
+                                   **self.s_headers)
+        self.assertEqual(response.status_code, 400)  # Bad Request, 367 days
+        response = self.client.get('/api/calendar/')
+        self.assertEqual(response.status_code, 401)  # Unauthorized
+
+    def test_night(self):
+        response = self.client.get('/api/calendar/night/', {'date': '3021-12-31'}, **self.s_headers)
+        self.assertEqual(loads(response.content)['rooms'], [{'number': 101, 'booking': 1, 'surname': 'Staff'}])
+        response = self.client.get('/api/calendar/night/', {'date': '3022-01-02'}, **self.s_headers)
+        self.assertEqual(loads(response.content)['rooms'], [])  # check-out day
+
+    def test_calendar_view(self):
+        self.client.login(username='user_staff', password='password')
+        response = self.client.get('/calendar/', {'date_from': '3021-12-29', 'date_to': '3022-01-02'})
+        self.assertEqual(response.status_code, 200)  # OK
+        self.assertContains(response, 'class="bg-danger"', count=3)
+
+
+class ConcurrentBookingTest(TransactionTestCase):
+    def setUp(self):
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.s_headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'user_staff:password').decode("ascii")}
+        group_staff.user_set.add(self.user_staff)
+        for number in range(101, 104):
+            Room.objects.create(number=number, category=1)
+
+    def test_parallel_posts_never_overlap(self):
+        # 48 requests for 3 rooms and 8 short stays, most of them compete for the same room nights
+        payloads = [{"surname": "Staff", "rooms": [101 + i % 3], "check_in": f'3021-09-{1 + i % 8 * 3:02d}',
+                     "check_out": f'3021-09-{3 + i % 8 * 3:02d}'} for i in range(48)]
+        stats = post_bookings_concurrently(payloads, self.s_headers, workers=8)
+        self.assertEqual(stats['created'] + stats['rejected'] + stats['failed'], 48)
+        self.assertGreater(stats['created'], 0)
+        self.assertEqual(stats['created'], Booking.objects.count())
+        self.assertEqual(find_overlaps(RoomReservation.objects.values_list('room', 'check_in', 'check_out')), [])
+
+
+class SQLiteModeTest(TestCase):
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite only')
+    def test_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS.get('busy_timeout', 5000))
+
+    def test_retry_on_locked(self):
+        calls = []
+
+        def locked_twice():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'saved'
+
+        def always_locked():
+            calls.append(1)
+            raise OperationalError('database is locked')
+
+        with mock.patch('hotel.locking.LOCKED_RETRY_DELAY', 0):
+            with mock.patch.object(connection, 'in_atomic_block', False):  # TestCase runs in a transaction
+                self.assertEqual(retry_on_locked(locked_twice), 'saved')
+                self.assertEqual(len(calls), 3)
+                calls.clear()
+                with self.assertRaises(OperationalError):
+                    retry_on_locked(always_locked)
+                self.assertEqual(len(calls), LOCKED_RETRY_ATTEMPTS)
+            calls.clear()
+            with self.assertRaises(OperationalError):  # outer transaction is broken, nothing to retry
+                retry_on_locked(always_locked)
+            self.assertEqual(len(calls), 1)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.s_headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'user_staff:password').decode("ascii")}
+        group_staff.user_set.add(self.user_staff)
+        self.room_101 = Room.objects.create(number=101, category=1)
+        registry.reset()
+
+    def test_find_repeated_queries(self):
+        queries = [f"SELECT * FROM hotel_room U0 WHERE U0.number = {number} AND U0.name = 'x''y'" for number in range(5)]
+        queries += ['SELECT * FROM hotel_room WHERE number IN (1, 2)', 'SELECT * FROM hotel_room WHERE number IN (3)']
+        self.assertEqual(find_repeated_queries(queries),
+                         {"SELECT * FROM hotel_room U0 WHERE U0.number = ? AND U0.name = ?": 5})
+        self.assertEqual(find_repeated_queries(queries[5:], threshold=2),
+                         {'SELECT * FROM hotel_room WHERE number IN (?)': 2})
+
+    @override_settings(HOTEL_METRICS=True)
+    def test_metrics_endpoint(self):
+        self.client.get('/api/rooms/')
+        self.client.get('/api/rooms/101/')
+        response = self.client.get('/api/metrics/', **self.s_headers)
+        self.assertEqual(response.status_code, 200)  # OK
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode()
+        self.assertIn('hotel_request_duration_seconds_count{view="hotel:room-list"} 1', text)
+        self.assertIn('hotel_request_queries_bucket{view="hotel:room-detail",le="+Inf"} 1', text)
+        self.assertIn('hotel_request_n_plus_one_total{view="hotel:room-list"} 0', text)
+
+    def test_request_queries_full_log(self):
+        log = deque([{'sql': str(n)} for n in range(5)], maxlen=5)
+        self.assertEqual(request_queries(deque(list(log)[:3], maxlen=5), 1, log[0]), [log[1], log[2]])
+        last_before = log[1]
+        log.extend([{'sql': 'a'}, {'sql': 'b'}])  # the two oldest entries are dropped
+        self.assertEqual([query['sql'] for query in request_queries(log, 2, last_before)], ['2', '3', '4', 'a', 'b'])
+        log.extend([{'sql': 'c'}, {'sql': 'd'}])
+        self.assertEqual(len(request_queries(log, 2, last_before)), 5)  # all of them are new
+
+    def test_anon_metrics_not_allowed(self):
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 401)  # Unauthorized
+
+    @override_settings(HOTEL_METRICS=True)
+    def test_n_plus_one_flagged(self):
+        def view(request):
+            for booking in range(6):
+                list(Room.objects.filter(number=100 + booking))
+            return HttpResponse()
+
+        with self.assertLogs('hotel.metrics', 'WARNING') as logs:
+            MetricsMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn('6x SELECT', logs.output[0])
+        self.assertEqual(registry.views['unresolved'].n_plus_one, 1)
+        self.assertEqual(registry.views['unresolved'].queries.sum, 6)
+
+
+class ASGITest(TransactionTestCase):
+    # the ASGI application runs queries in its own threads, which do not see data of a TestCase transaction
+    def setUp(self):
+        self.client = Client()
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.room_101 = Room.objects.create(number=101, category=1)
+        self.room_102 = Room.objects.create(number=102, category=4)
+        create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-09-01', '3021-09-03')
+        self.application = HotelASGIApplication(get_wsgi_application())
+
+    def get(self, path, query_string='', headers=()):
+        return asyncio.run(asgi_get(self.application, path, query_string, headers))
+
+    def test_availability_same_as_api(self):
+        for query_string in ['check_in=3021-09-02&check_out=3021-09-05', 'check_in=3021-09-04&check_out=3021-09-05',
+                             'check_in=3021-09-04&check_out=3021-09-05&category=D', 'check_in=3021-09-05']:
+            status, body = self.get('/api/availability/', query_string)
+            response = self.client.get('/api/availability/?' + query_string, HTTP_ACCEPT='application/json')
+            self.assertEqual(status, response.status_code)
+            self.assertEqual(loads(body), loads(response.content))
+
+    def test_authorization_goes_through_api(self):
+        status, _ = self.get('/api/availability/', 'check_in=3021-09-02&check_out=3021-09-05',
+                             [(b'authorization', b'Basic ' + base64.b64encode(b'user_staff:wrong'))])
+        self.assertEqual(status, 401)  # Unauthorized, not ignored
+
+    def test_other_endpoints(self):
+        status, body = self.get('/api/rooms/', headers=[(b'accept', b'application/json')])
+        self.assertEqual(status, 200)  # OK
+        self.assertEqual([x['number'] for x in loads(body)['results']], [101, 102])
+        status, _ = self.get('/api/bookings/1/', headers=[(b'accept', b'application/json')])
+        self.assertEqual(status, 200)  # OK
+
+
+class TokenAuthTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        group_staff.user_set.add(self.user_staff)
+        Room.objects.create(number=101, category=1)
+
+    def login(self):
+        response = self.client.post('/api/auth/login/', {'username': 'user_staff', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)  # OK
+        return {'HTTP_AUTHORIZATION': 'Token ' + loads(response.content)['token']}
+
+    def test_login_wrong_password(self):
+        response = self.client.post('/api/auth/login/', {'username': 'user_staff', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 400)  # Bad Request
+
+    def test_token_without_password_hashing(self):
+        t_headers = self.login()
+        self.assertEqual(self.client.get('/api/search/', **t_headers).status_code, 200)  # OK, token is cached now
+        with mock.patch.object(User, 'check_password') as check_password, self.assertNumQueries(1):
+            response = self.client.get('/api/search/', **t_headers)  # bookings only, no token, user or groups
+        self.assertEqual(response.status_code, 200)  # OK
+        check_password.assert_not_called()
+
+    def test_logout_revokes_token(self):
+        t_headers = self.login()
+        self.assertEqual(self.client.get('/api/search/', **t_headers).status_code, 200)  # OK
+        self.assertEqual(self.client.post('/api/auth/logout/', **t_headers).status_code, 204)  # No Content
+        self.assertEqual(self.client.get('/api/search/', **t_headers).status_code, 401)  # Unauthorized
+
+    def test_inactive_user_token_rejected(self):
+        t_headers = self.login()
+        self.assertEqual(self.client.get('/api/search/', **t_headers).status_code, 200)  # OK
+        self.user_staff.is_active = False
+        self.user_staff.save()
+        self.assertEqual(self.client.get('/api/search/', **t_headers).status_code, 401)  # Unauthorized
+
+    def test_expired_token(self):
+        t_headers = self.login()
+        with override_settings(HOTEL_TOKEN_TTL=0):
+            self.assertEqual(self.client.get('/api/search/', **t_headers).status_code, 401)  # Unauthorized
+            self.assertFalse(Token.objects.exists())
+        new_headers = self.login()
+        self.assertNotEqual(new_headers, t_headers)
+        self.assertEqual(self.client.get('/api/search/', **new_headers).status_code, 200)  # OK
+
+
+class BulkImportTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.s_headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'user_staff:password').decode("ascii")}
+        group_staff.user_set.add(self.user_staff)
+        self.room_101 = Room.objects.create(number=101, category=1)
+        self.room_102 = Room.objects.create(number=102, category=4)
+        create_booking(1, self.user_staff, 'Staff', [self.room_101], '3021-09-01', '3021-09-03')
+
+    def post(self, url, data):
+        return self.client.post(url, data=dumps(data), content_type='application/json', **self.s_headers)
+
+    def test_bulk_add_rooms(self):
+        response = self.post('/api/rooms/bulk/', [{"number": 103, "category": 1}, {"number": 104, "category": 2}])
+        self.assertEqual(response.status_code, 201)  # Created
+        self.assertEqual(Room.objects.count(), 4)
+
+    def test_bulk_add_rooms_duplicates(self):
+        response = self.post('/api/rooms/bulk/', [{"number": 103, "category": 1}, {"number": 101, "category": 1},
+                                                  {"number": 103, "category": 2}])
+        self.assertEqual(response.status_code, 400)  # Bad Request
+        self.assertEqual([x['index'] for x in loads(response.content)['results']], [1, 2])
+        self.assertEqual(Room.objects.count(), 2)  # nothing saved
+
+    def test_bulk_add_bookings(self):
+        data = [{"surname": "Group", "rooms": [101, 102], "check_in": "3021-09-05", "check_out": "3021-09-07"},
+                {"surname": "Group", "rooms": [101], "check_in": "3021-09-10", "check_out": "3021-09-12"}]
+        get_seasonal_rates()
+        # independent of the number of rooms, SQLite (no ids from bulk_create) adds only one insert per booking,
+        # booked nights of all bookings are one insert, calendar bitmaps of all rooms are 3 queries per year
+        with self.assertNumQueries(19):
+            response = self.post('/api/bookings/bulk/', data)
+        self.assertEqual(response.status_code, 201)  # Created
+        results = loads(response.content)['results']
+        self.assertEqual([x['get_booking_price'] for x in results], [2 * 250, 2 * 200])
+        self.assertEqual(RoomReservation.objects.count(), 4)
+
+    def test_bulk_add_bookings_overlapping(self):
+        data = [{"surname": "Group", "rooms": [102], "check_in": "3021-09-05", "check_out": "3021-09-07"},
+                {"surname": "Group", "rooms": [101], "check_in": "3021-09-02", "check_out": "3021-09-04"},
+                {"surname": "Group", "rooms": [102], "check_in": "3021-09-06", "check_out": "3021-09-08"},
+                {"surname": "Group", "rooms": [103], "check_in": "3021-09-06", "check_out": "3021-09-08"}]
+        response = self.post('/api/bookings/bulk/', data)
+        self.assertEqual(response.status_code, 400)  # Bad Request
+        self.assertEqual([x['index'] for x in loads(response.content)['results']], [3])  # unknown room first
+        response = self.post('/api/bookings/bulk/', data[:3])
+        self.assertEqual([x['index'] for x in loads(response.content)['results']], [1, 2])
+        self.assertEqual(Booking.objects.count(), 1)  # nothing saved
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.s_headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'user_staff:password').decode("ascii")}
+        group_staff.user_set.add(self.user_staff)
+        self.room_101 = Room.objects.create(number=101, category=1)
+        self.room_102 = Room.objects.create(number=102, category=4)
+        create_booking(1, self.user_staff, 'Kowalski', [self.room_101, self.room_102], '3021-09-01', '3021-09-03')
+        create_booking(2, self.user_staff, 'Nowak', [self.room_102], '3021-09-05', '3021-09-06')
+
+    def test_export_bookings_csv(self):
+        response = self.client.get('/api/bookings/export/', **self.s_headers)
+        self.assertEqual(response.status_code, 200)  # OK
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,user,surname,rooms,check_in,check_out,created,nights,price')
+        self.assertTrue(lines[1].startswith(f'1,{self.user_staff.id},Kowalski,101 102,3021-09-01,3021-09-03,'))
+        self.assertTrue(lines[1].endswith(',2,500'))
+        self.assertEqual(len(lines), 3)
+
+    def test_export_search_ndjson(self):
+        response = self.client.get('/api/search/export/', {'output': 'ndjson', 'surname': 'Nowak'}, **self.s_headers)
+        rows = [loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(x['id'], x['rooms'], x['price']) for x in rows], [(2, [102], 50)])
+
+    def test_export_in_chunks(self):
+        create_booking(3, self.user_staff, 'Nowak', [self.room_101], '3021-09-05', '3021-09-07')
+        with mock.patch('hotel.export.CHUNK_SIZE', 1):
+            response = self.client.get('/api/search/export/', {'output': 'ndjson', 'ordering': '-price'},
+                                       **self.s_headers)
+            rows = [loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(x['id'], x['rooms'], x['price']) for x in rows], [(1, [101, 102], 500), (3, [101], 400),
+                                                                             (2, [102], 50)])
+
+    def test_anon_export_not_allowed(self):
+        response = self.client.get('/api/bookings/export/')
+        self.assertEqual(response.status_code, 401)  # Unauthorized
+
+
+class BenchmarkSeedTest(TestCase):
+    def test_seed_bookings(self):
+        end = seed_bookings(rooms=10, users=3, bookings=250, batch_size=100)
+        self.assertEqual(Booking.objects.count(), 250)
+        self.assertEqual(RoomReservation.objects.count(), 250)
+        self.assertEqual(Booking.objects.filter(rooms__isnull=True).count(), 0)
+        self.assertEqual(find_overlaps(RoomReservation.objects.values_list('room', 'check_in', 'check_out')), [])
+        self.assertFalse(Booking.objects.filter(check_out__gte=end).exists())
+        user = User.objects.get(username='bench0')
+        self.assertEqual(Booking.objects.create(user=user, surname='Next', check_in=end, check_out=end).id, 251)
+
+    def test_benchmark_api(self):
+        end = seed_bookings(rooms=10, users=3, bookings=100)
+        report = benchmark_api(end, repeat=2)
+        self.assertIn('html_search', report)
+        self.assertEqual(report['api_booking_post']['statuses'], {'201': 2})
+        for name, result in report.items():
+            self.assertLessEqual(result['p50'], result['max'])
+            self.assertEqual(sum(result['statuses'].values()), 2)
+            self.assertTrue(set(result['statuses']) <= {'200', '201'}, name)
+
+
 
 # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 # %%%%%%%%%%%%%%%%%%%%%% FRONTEND TESTS %%%%%%%%%%%%%%%%%%%%%%%%
@@ -303,7 +1239,7 @@ class FrontendBookingSimpleTest(TestCase):
         self.assertEqual(len(bookings), 0)
 
 
-class BookingAdvancedTest(TestCase):
+class FrontendBookingAdvancedTest(TestCase):
     def setUp(self):
         self.client = Client()
         group_staff, _ = Group.objects.get_or_create(name='Staff')
@@ -369,3 +1305,64 @@ class BookingAdvancedTest(TestCase):
         bookings = Booking.objects.get(id=1)
         self.assertEqual(datetime.strftime(getattr(bookings, 'check_out'), "%Y-%m-%d"), '3021-09-07')  # changed
 
+
+
+class FrontendBookingFilterTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        group_client, _ = Group.objects.get_or_create(name='Client')
+        self.user_client = User.objects.create_user('user_client', 'test1.test@gmail.com', 'password')
+        self.c_headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'user_client:password').decode("ascii")}
+        group_client.user_set.add(self.user_client)
+        group_staff, _ = Group.objects.get_or_create(name='Staff')
+        self.user_staff = User.objects.create_user('user_staff', 'test2.test@gmail.com', 'password')
+        self.s_headers = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'user_staff:password').decode("ascii")}
+        group_staff.user_set.add(self.user_staff)
+        self.room_101 = Room.objects.create(number=101, category=1)
+        self.room_102 = Room.objects.create(number=102, category=4)
+        create_booking(1, self.user_staff, 'Smith', [self.room_101], '3021-09-01', '3021-09-03')
+        create_booking(2, self.user_client, 'Smithson', [self.room_102], '3021-09-05', '3021-09-06')
+        create_booking(3, self.user_client, 'Jones', [self.room_101, self.room_102], '3021-09-10', '3021-09-11')
+
+    def ids(self, url, headers, **params):
+        response = self.client.get(url, params, **headers)
+        self.assertEqual(response.status_code, 200)  # OK
+        return [booking.id for booking in response.data['bookings']]
+
+    def test_staff_filters(self):
+        self.assertEqual(self.ids('/bookings/', self.s_headers), [3, 2, 1])  # newest first
+        self.assertEqual(self.ids('/bookings/', self.s_headers, surname_prefix='Smith'), [2, 1])
+        self.assertEqual(self.ids('/bookings/', self.s_headers, surname_prefix='Smiths'), [2])
+        self.assertEqual(self.ids('/bookings/', self.s_headers, user='user_client'), [3, 2])
+        self.assertEqual(self.ids('/bookings/', self.s_headers, rooms='101'), [3, 1])
+        self.assertEqual(self.ids('/bookings/', self.s_headers, active_from='3021-09-04', active_to='3021-09-09'), [2])
+        self.assertEqual(self.ids('/bookings/', self.s_headers, ordering='check_in'), [1, 2, 3])
+        self.assertEqual(self.ids('/bookings/', self.s_headers, ordering='-price'), [1, 3, 2])
+
+    def test_client_cannot_search_names(self):
+        self.assertEqual(self.ids('/bookings/', self.c_headers, surname_prefix='Smith', user='user_client'),
+                         [3, 2, 1])
+        self.assertEqual(self.ids('/bookings/', self.c_headers, ordering='-price'), [3, 2, 1])  # not allowed
+        self.assertEqual(self.ids('/bookings/', self.c_headers, rooms='102', ordering='check_in'), [2, 3])
+
+    def test_pages(self):
+        response = self.client.get('/bookings/', {'ordering': 'check_in', 'page_size': 2}, **self.s_headers)
+        self.assertEqual([booking.id for booking in response.data['bookings']], [1, 2])
+        self.assertIn('ordering=check_in', response.data['next'])
+        response = self.client.get(response.data['next'], **self.s_headers)
+        self.assertEqual([booking.id for booking in response.data['bookings']], [3])
+        self.assertEqual(self.ids('/search/', self.s_headers, surname_prefix='Smith', page_size=1), [2])
+
+    def test_wrong_params(self):
+        response = self.client.get('/bookings/', {'active_from': 'yesterday'}, **self.s_headers)
+        self.assertEqual(response.status_code, 400)  # Bad Request
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite query plan')
+    def test_surname_prefix_uses_index(self):
+        query, params = Booking.objects.surname_starts_with('Smi').values('id').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + query, params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('hotel_booking_surname_idx', plan)
+        self.assertEqual(list(Booking.objects.surname_starts_with('Smi').order_by('id').values_list('id', flat=True)),
+                         [1, 2])
@@ -3,7 +3,8 @@ from rest_framework import routers
 from django.conf.urls import url, include
 from django.contrib.auth.views import LoginView, LogoutView
 from .views import HomeView, RoomViewSet, BookingViewSet, BookingList, BookingAdd, BookingEdit, RoomList, RoomAdd,\
-    RoomEdit, SearchViewSet, BookingSearch, register
+    RoomEdit, SearchViewSet, BookingSearch, AvailabilityViewSet, ReportViewSet, MetricsViewSet, \
+    AuthViewSet, CalendarViewSet, CalendarView, register
 
 
 app_name = 'hotel'
@@ -11,6 +12,11 @@ router = routers.DefaultRouter()
 router.register('rooms', RoomViewSet)
 router.register('bookings', BookingViewSet)
 router.register('search', SearchViewSet, basename='search')
+router.register('availability', AvailabilityViewSet, basename='availability')
+router.register('reports', ReportViewSet, basename='reports')
+router.register('calendar', CalendarViewSet, basename='calendar')
+router.register('metrics', MetricsViewSet, basename='metrics')
+router.register('auth', AuthViewSet, basename='auth')
 
 urlpatterns = [
     url(r'^api/', include(router.urls)),
@@ -25,5 +31,6 @@ urlpatterns = [
     url(r'^rooms/$', RoomList.as_view(), name='rooms'),
     url(r'^rooms/(?P<number>[0-9]+)/$', RoomEdit.as_view()),
     url(r'^search/$', BookingSearch.as_view(), name='search'),
+    url(r'^calendar/$', CalendarView.as_view(), name='calendar'),
 ]
 
@@ -1,6 +1,7 @@
 from rest_framework import serializers, status
 from datetime import datetime, date, timedelta
-from hotel.models import Booking
+from hotel.models import RoomNight
+from hotel import availability
 
 # these validations are used by serializers
 
@@ -10,20 +11,22 @@ class CustomException(serializers.ValidationError):
         if status_code is not None:
             self.status_code = status_code
 
-def check_availability(room, check_in, check_out, booking_to_exclude=None):
+def check_availability(rooms, check_in, check_out, booking_to_exclude=None, cached=False):
     # making sure that check_in and check_out are date objects, not strings
     check_in, check_out = [datetime.strptime(x, "%Y-%m-%d").date() if isinstance(x, str) else x for x in [check_in, check_out]]
-    existing_bookings = Booking.objects.filter(rooms=room)
-    if booking_to_exclude is not None:
-        existing_bookings = existing_bookings.exclude(id=booking_to_exclude.id)
-
-    for existing_booking in existing_bookings:  # every date is in date format here, not str
-        if (existing_booking.check_in > check_out) or (existing_booking.check_out < check_in):
-            # in this case the new booking is not overlapping that single existing booking checked
-            continue
-        else:
-            # in this case it overlaps existing booking, so cannot be accepted
+    # cached=True lets new bookings be checked in memory (availability.py), the snapshot cannot tell which nights
+    # belong to booking_to_exclude
+    if cached and booking_to_exclude is None and availability.is_enabled():
+        if not availability.are_rooms_available(rooms, check_in, check_out):
             raise CustomException('At least one of selected rooms is booked')
+        return
+    # one query for all rooms on the unique (room, date) index of booked nights - a room is free when none of its
+    # nights is between the day before check_in and check_out (the same edge days are treated as overlapping)
+    overlapping = RoomNight.objects.filter(room__in=rooms).blocking(check_in, check_out)
+    if booking_to_exclude is not None:
+        overlapping = overlapping.exclude(booking=booking_to_exclude)
+    if overlapping.exists():
+        raise CustomException('At least one of selected rooms is booked')
 
 
 def check_timespan(check_in, check_out):
@@ -31,4 +34,20 @@ def check_timespan(check_in, check_out):
     if check_in >= check_out:
         raise CustomException('"Check in" date should precede "Check out"')
     if (check_in < date.today()) or (check_out < (date.today() + timedelta(hours=1))):
-        raise CustomException('You can only book rooms in future dates')
\ No newline at end of file
+        raise CustomException('You can only book rooms in future dates')
+
+
+def find_overlaps(reservations):
+    """
+    Takes (room, check_in, check_out) tuples and returns pairs of overlapping ones, in memory
+    (the same rules as check_availability, edge days overlap).
+    """
+    overlaps = []
+    by_room = {}
+    for reservation in sorted(reservations):
+        previous = by_room.get(reservation[0])
+        if previous is not None and reservation[1] <= previous[2]:
+            overlaps.append((previous, reservation))
+        if previous is None or reservation[2] > previous[2]:
+            by_room[reservation[0]] = reservation
+    return overlaps
@@ -1,31 +1,49 @@
 
-from datetime import datetime
-from json import dumps
+from datetime import datetime, timedelta
+from django.http import HttpResponse
 from django.shortcuts import render
 from django.views.generic import TemplateView
 from django.contrib import messages
 from django.contrib.auth import login
 from django.shortcuts import get_object_or_404, redirect
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.mixins import ListModelMixin
 from rest_framework.viewsets import GenericViewSet
 from rest_framework.response import Response
+from rest_framework.serializers import ValidationError
 from rest_framework.renderers import TemplateHTMLRenderer
 from rest_framework.generics import GenericAPIView
-from drf_yasg.utils import swagger_auto_schema
-from .models import Room, Booking
-from .serializers import RoomSerializer, BookingSerializer, SearchBookingSerializer
-from .permissions import HasGroupPermission, REQ_GROUPS_BOOKINGS, REQ_GROUPS_BOOKINGS_UPDATE, REQ_GROUPS_ROOMS
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.authtoken.models import Token
+from rest_framework.authtoken.serializers import AuthTokenSerializer
+from drf_yasg.utils import swagger_auto_schema, no_body
+from .models import Room, Booking, RoomNight
+from .serializers import RoomSerializer, BookingSerializer, SearchBookingSerializer, AvailabilitySerializer, \
+    ReportSerializer, BulkBookingSerializer, ExportSerializer, CalendarSerializer, NightSerializer
+from .permissions import HasGroupPermission, is_in_group, REQ_GROUPS_BOOKINGS, REQ_GROUPS_BOOKINGS_UPDATE, \
+    REQ_GROUPS_ROOMS
 from .forms import SignUpForm
-from .config import ROOM_PRICES
+from .pagination import BookingCursorPagination, RoomCursorPagination, StableOrderingFilter
+from .pricing import get_room_rates
+from .reports import occupancy_report, revenue_report
+from .occupancy import occupancy_grid
+from .availability import available_rooms
+from .bulk import import_rooms, import_bookings
+from .export import export_response
+from .caching import CachedResponseMixin
+from .metrics import registry
+from .authentication import issue_token, token_expires
 from HMS.settings import REGISTRATION_OPEN
 
 # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 # %%%%%%%%%%%%%%%%%%%%%%%%% API VIEWS %%%%%%%%%%%%%%%%%%%%%%%%%%
 # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
-class RoomViewSet(viewsets.ModelViewSet):
+class RoomViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Room.objects.all()
     serializer_class = RoomSerializer
+    pagination_class = RoomCursorPagination
+    cache_tables = ('room',)  # list and retrieve are cached (caching.py)
     http_method_names = ['get', 'post', 'head', 'put', 'delete']
     permission_classes = (HasGroupPermission,)
     required_groups = REQ_GROUPS_ROOMS
@@ -39,58 +57,214 @@ class RoomViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_403_FORBIDDEN)
         return super().destroy(request, *args, **kwargs)
 
-class BookingViewSet(viewsets.ModelViewSet):
+    @swagger_auto_schema(request_body=RoomSerializer(many=True))
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):  # POST list of rooms, all or nothing
+        try:
+            created, results = import_rooms(request.data)
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': results}, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+class BookingViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
+    pagination_class = BookingCursorPagination
+    cache_tables = ('booking', 'room', 'roomrate', 'seasonalrate')  # price depends on room categories and rates
+    cache_per_user = True
     http_method_names = ['get', 'post', 'head', 'put', 'delete']
     permission_classes = (HasGroupPermission,)
     required_groups = REQ_GROUPS_BOOKINGS
 
-    def create(self, request, *args, **kwargs):  # POST
-        serializer = BookingSerializer(data=request.data, context={'request': request})
-        if serializer.is_valid():
-            return super().create(request, *args, **kwargs)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            # annotated price would be stale after PUT, so it is used only for read-only actions
+            return Booking.objects.with_details()
+        return super().get_queryset()
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-    def update(self, request, *args, **kwargs):  # PUT
-        instance = self.get_object()
-        serializer = BookingSerializer(instance=instance, data=request.data, context={'request': request})
+    @swagger_auto_schema(request_body=BulkBookingSerializer(many=True))
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):  # POST list of bookings, all or nothing
+        try:
+            created, results = import_bookings(request.data, request.user)
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        if not created:
+            return Response({'results': results}, status=status.HTTP_400_BAD_REQUEST)
+        bookings = Booking.objects.with_details().in_bulk([result['id'] for result in results])
+        return Response({'results': [dict(index=result['index'], **BookingSerializer(bookings[result['id']]).data)
+                                     for result in results]}, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(query_serializer=ExportSerializer)
+    @action(detail=False, required_groups={'GET': ['Staff']})
+    def export(self, request):  # streamed CSV or NDJSON of all bookings
+        serializer = ExportSerializer(data=request.query_params)
         if serializer.is_valid():
-            return super().update(request, *args, **kwargs)
+            return export_response(Booking.objects.with_price().order_by('id'), serializer.validated_data['output'])
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+
+def filter_bookings(queryset, params):
+    """
+    Applies search parameters (SearchBookingSerializer, already validated) to a queryset of bookings - every
+    filter is served by an index (Booking.Meta.indexes, migration 0009 for surname prefixes).
+    """
+    params = {key: value for key, value in params.items() if value != ''}
+    if 'rooms' in params.keys():
+        queryset = queryset.with_rooms(int(room) for room in params['rooms'].split(','))
+    if 'created' in params.keys():
+        queryset = queryset.created_on(datetime.strptime(params['created'], '%Y-%m-%d').date())
+    if 'active_from' in params.keys() or 'active_to' in params.keys():  # bookings lasting (a part of) the period
+        active = {key: datetime.strptime(params[key], '%Y-%m-%d').date()
+                  for key in ('active_from', 'active_to') if key in params}
+        queryset = queryset.active_between(active.get('active_from'), active.get('active_to'))
+    if 'surname_prefix' in params.keys():
+        queryset = queryset.surname_starts_with(params['surname_prefix'])
+    if 'user' in params.keys():
+        queryset = queryset.filter(user__username=params['user'])
+    # price and nights are SQL annotations (see pricing.py), so they are filtered by the database
+    if 'price_min' in params.keys():
+        queryset = queryset.filter(price__gte=params['price_min'])
+    if 'price_max' in params.keys():
+        queryset = queryset.filter(price__lte=params['price_max'])
+    # other parameters (ordering, cursor, page_size) are not booking fields
+    params = {key: params[key] for key in ('surname', 'check_in', 'check_out') if key in params}
+    return queryset.filter(**params)
+
+
 class SearchViewSet(GenericViewSet, ListModelMixin):
-    serializer_class = SearchBookingSerializer
+    serializer_class = BookingSerializer  # results with price and nights, SearchBookingSerializer validates params
+    pagination_class = BookingCursorPagination
+    filter_backends = [StableOrderingFilter]
+    ordering_fields = ['price', 'nights', 'check_in', 'check_out', 'created', 'surname']  # ?ordering=-price
+    ordering = BookingCursorPagination.ordering
     http_method_names = ['get']
     permission_classes = (HasGroupPermission,)
     required_groups = {'GET': ['Staff']}
 
     def get_queryset(self):
-        queryset = Booking.objects.all()
-        params = self.request.query_params.copy().dict()
-        params = {key: value for key, value in params.items() if value != ''}
-        if 'rooms' in params.keys():
-            rooms = params['rooms'].split(',')
-            for room in rooms:
-                queryset = queryset.filter(rooms=room).distinct()
-            del params['rooms']
-        if 'created' in params.keys():
-            created = datetime.strptime(params['created'], '%Y-%m-%d')
-            queryset = queryset.filter(created__date=created).distinct()
-            del params['created']
-        queryset = queryset.filter(**params).distinct()
-        return queryset
+        return filter_bookings(Booking.objects.with_details(), self.request.query_params.dict())
 
     @swagger_auto_schema(query_serializer=SearchBookingSerializer)  # just to fix schemas in swagger
     def list(self, request, *args, **kwargs):
         serializer = SearchBookingSerializer(data=self.request.data, context={'request': self.request})
         if serializer.is_valid():
-            return super().list(self)
+            return super().list(request, *args, **kwargs)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @swagger_auto_schema(query_serializer=SearchBookingSerializer)
+    @action(detail=False)
+    def export(self, request):  # streamed CSV or NDJSON of search results, ?output=csv|ndjson
+        serializer = SearchBookingSerializer(data=self.request.data, context={'request': self.request})
+        export_params = ExportSerializer(data=request.query_params)
+        if serializer.is_valid() and export_params.is_valid():
+            queryset = self.filter_queryset(self.get_queryset())
+            return export_response(queryset, export_params.validated_data['output'], filename='search')
+        return Response(serializer.errors or export_params.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class AvailabilityViewSet(GenericViewSet, ListModelMixin):
+    serializer_class = RoomSerializer
+    http_method_names = ['get']
+    permission_classes = (HasGroupPermission,)
+    required_groups = {'GET': ['__all__']}
+
+    def get_queryset(self):
+        params = AvailabilitySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+        # the same rooms are served by the ASGI fast path (asynchronous.py)
+        return available_rooms(params['check_in'], params['check_out'], params.get('category'))
+
+    @swagger_auto_schema(query_serializer=AvailabilitySerializer)  # just to fix schemas in swagger
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+class ReportViewSet(GenericViewSet):
+    serializer_class = ReportSerializer
+    http_method_names = ['get']
+    permission_classes = (HasGroupPermission,)
+    required_groups = {'GET': ['Staff']}
+
+    def get_report(self, request, build):
+        serializer = ReportSerializer(data=request.query_params)
+        if serializer.is_valid():
+            params = serializer.validated_data
+            return Response({'period': params['period'],
+                             'results': build(params['date_from'], params['date_to'], params['period'])})
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @swagger_auto_schema(query_serializer=ReportSerializer)
+    @action(detail=False)
+    def occupancy(self, request):
+        return self.get_report(request, occupancy_report)
+
+    @swagger_auto_schema(query_serializer=ReportSerializer)
+    @action(detail=False)
+    def revenue(self, request):
+        return self.get_report(request, revenue_report)
+
+class CalendarViewSet(GenericViewSet):
+    serializer_class = CalendarSerializer
+    http_method_names = ['get']
+    permission_classes = (HasGroupPermission,)
+    required_groups = {'GET': ['Staff']}
+
+    @swagger_auto_schema(query_serializer=CalendarSerializer)
+    def list(self, request):  # booked nights of every room, one '0' (free) or '1' (booked) character per night
+        serializer = CalendarSerializer(data=request.query_params)
+        if serializer.is_valid():
+            params = serializer.validated_data
+            grid = occupancy_grid(params['date_from'], params['date_to'])
+            return Response({'date_from': params['date_from'], 'date_to': params['date_to'],
+                             'rooms': [{'number': number, 'nights': nights} for number, nights in grid]})
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @swagger_auto_schema(query_serializer=NightSerializer)
+    @action(detail=False)
+    def night(self, request):  # who stays in which room during one night, from the date index of RoomNight
+        serializer = NightSerializer(data=request.query_params)
+        if serializer.is_valid():
+            day = serializer.validated_data['date']
+            nights = RoomNight.objects.filter(date=day).order_by('room') \
+                .values_list('room', 'booking', 'booking__surname')
+            return Response({'date': day, 'rooms': [{'number': room, 'booking': booking, 'surname': surname}
+                                                    for room, booking, surname in nights]})
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class AuthViewSet(GenericViewSet):
+    serializer_class = AuthTokenSerializer
+    permission_classes = (HasGroupPermission,)
+    required_groups = {'POST': ['__all__']}
+
+    @swagger_auto_schema(request_body=AuthTokenSerializer)
+    @action(detail=False, methods=['post'])
+    def login(self, request):  # POST username and password, returns a token for "Authorization: Token <token>"
+        serializer = AuthTokenSerializer(data=request.data, context={'request': request})
+        if serializer.is_valid():
+            token = issue_token(serializer.validated_data['user'])
+            return Response({'token': token.key, 'expires': token_expires(token)})
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @swagger_auto_schema(request_body=no_body)
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def logout(self, request):  # revokes the token of the user
+        Token.objects.filter(user=request.user).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MetricsViewSet(GenericViewSet):
+    http_method_names = ['get']
+    permission_classes = (HasGroupPermission,)
+    required_groups = {'GET': ['Staff']}
+    swagger_schema = None  # plain text for Prometheus, see metrics.py
+
+    def list(self, request):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 
 # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 # %%%%%%%%%%%%%%%%%%%%%%% FRONTEND VIEWS %%%%%%%%%%%%%%%%%%%%%%%
@@ -137,8 +311,10 @@ class RoomList(RoomGenericAPIView):
     required_groups = REQ_GROUPS_ROOMS
 
     def get(self, request):
-        queryset = Room.objects.all()
-        return Response({'rooms': queryset})
+        paginator = RoomCursorPagination()
+        rooms = paginator.paginate_queryset(Room.objects.all(), request, view=self)
+        return Response({'rooms': rooms, 'next': paginator.get_next_link(),
+                         'previous': paginator.get_previous_link()})
 
 class RoomAdd(RoomGenericAPIView):
     template_name = 'room_add.html'
@@ -191,13 +367,41 @@ class RoomEdit(RoomGenericAPIView):
         return Response({'serializer': serializer, 'style': self.style})
 
 
-class BookingList(BookingGenericAPIView):
+class BookingPageMixin:
+    """
+    Filtered, sorted and paged booking lists of the HTML pages - the parameters of SearchViewSet (?active_from=,
+    active_to=, rooms=, surname_prefix=, user=, ordering=, page_size=), so a page queries and renders only its rows.
+    """
+    pagination_class = BookingCursorPagination
+    filter_backends = [StableOrderingFilter]
+    ordering_fields = ['check_in', 'created', 'price']
+    ordering = BookingCursorPagination.ordering
+
+    def get_page(self, bookings):
+        bookings = self.paginate_queryset(self.filter_queryset(bookings))
+        return {'bookings': bookings, 'next': self.paginator.get_next_link(),
+                'previous': self.paginator.get_previous_link()}
+
+
+class BookingList(BookingPageMixin, BookingGenericAPIView):
     template_name = 'bookings.html'
     required_groups = REQ_GROUPS_BOOKINGS
+    public_params = ('active_from', 'active_to', 'rooms', 'ordering', 'cursor', 'page_size')
+
+    @property
+    def ordering_fields(self):  # prices of other guests' bookings are hidden from non-staff, so is their order
+        if is_in_group(self.request.user, 'Staff'):
+            return BookingPageMixin.ordering_fields
+        return ['check_in', 'created']
 
     def get(self, request):
-        queryset = Booking.objects.all()
-        return Response({'bookings': queryset})
+        serializer = SearchBookingSerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = request.query_params.dict()
+        if not is_in_group(request.user, 'Staff'):  # names of other guests are hidden, so they are not searchable
+            params = {key: value for key, value in params.items() if key in self.public_params}
+        return Response(self.get_page(filter_bookings(Booking.objects.with_details(), params)))
 
 
 class BookingAdd(BookingGenericAPIView):
@@ -206,12 +410,16 @@ class BookingAdd(BookingGenericAPIView):
 
     def get(self, request):
         serializer = BookingSerializer
-        return Response({'serializer': serializer, 'style': self.style, 'ROOM_PRICES': dumps(ROOM_PRICES)})
+        return Response({'serializer': serializer, 'style': self.style, 'ROOM_PRICES': get_room_rates().json})
 
     def post(self, request):
         serializer = BookingSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save(user=self.request.user)
+            try:
+                serializer.save(user=self.request.user)
+            except ValidationError as error:  # rooms booked by a parallel request after validation
+                messages.warning(request, error.detail['rooms'])
+                return Response({'serializer': serializer, 'style': self.style})
             messages.success(request, f'Booking successfully added!')
             return redirect('/bookings/')
         return Response({'serializer': serializer, 'style': self.style})
@@ -224,7 +432,7 @@ class BookingEdit(BookingGenericAPIView):
         booking = get_object_or_404(Booking, pk=pk)
         serializer = BookingSerializer(instance=booking)
         return Response({'serializer': serializer, 'booking': booking, 'style': self.style,
-                         'ROOM_PRICES': dumps(ROOM_PRICES)})
+                         'ROOM_PRICES': get_room_rates().json})
 
     def post(self, request, pk):  # HTML PUT and DELETE workaround
         method = request.POST.get("method", "")  # hidden input in forms, two buttons
@@ -243,28 +451,43 @@ class BookingEdit(BookingGenericAPIView):
         instance = get_object_or_404(Booking, pk=pk)
         serializer = BookingSerializer(instance=instance, data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            try:
+                serializer.save()
+            except ValidationError as error:  # rooms booked by a parallel request after validation
+                messages.warning(request, error.detail['rooms'])
+                return Response({'serializer': serializer, 'style': self.style, 'ROOM_PRICES': get_room_rates().json})
             messages.success(request, f'Booking {instance.id} successfully edited!')
             return redirect('/bookings/')
-        return Response({'serializer': serializer, 'style': self.style, 'ROOM_PRICES': dumps(ROOM_PRICES)})
+        return Response({'serializer': serializer, 'style': self.style, 'ROOM_PRICES': get_room_rates().json})
 
 
-class BookingSearch(BookingGenericAPIView):
+class CalendarView(BookingGenericAPIView):
     http_method_names = ['get']
-    template_name = 'search.html'
+    template_name = 'calendar.html'
     required_groups = REQ_GROUPS_BOOKINGS_UPDATE
 
     def get(self, request):
-        if not request.query_params:
-            bookings = Booking.objects.all()
-            serializer = BookingSerializer
-            return Response({'serializer': serializer, 'style': self.style, 'bookings': bookings})
-        else:
-            # this serializer is just for validation, not for rendering
-            serializer = SearchBookingSerializer(data=self.request.data, context={'request': self.request})
-            if serializer.is_valid():
-                # reusing method from SearchViewSet
-                bookings = SearchViewSet.get_queryset(self)
-                serializer = BookingSerializer  # it has more fields that SearchBookingSerializer
-                return Response({'serializer': serializer, 'style': self.style, 'bookings': bookings})
+        serializer = CalendarSerializer(data=request.query_params)
+        if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        date_from, date_to = serializer.validated_data['date_from'], serializer.validated_data['date_to']
+        days = [date_from + timedelta(days=n) for n in range((date_to - date_from).days + 1)]
+        span, one_day = timedelta(days=len(days)), timedelta(days=1)  # previous and next links keep the length
+        return Response({'days': days, 'grid': occupancy_grid(date_from, date_to),
+                         'previous': f'?date_from={date_from - span}&date_to={date_from - one_day}',
+                         'next': f'?date_from={date_to + one_day}&date_to={date_to + span}'})
+
+
+class BookingSearch(BookingPageMixin, BookingGenericAPIView):
+    http_method_names = ['get']
+    template_name = 'search.html'
+    required_groups = REQ_GROUPS_BOOKINGS_UPDATE
+
+    def get(self, request):
+        # this serializer is just for validation, not for rendering
+        serializer = SearchBookingSerializer(data=self.request.data, context={'request': self.request})
+        if serializer.is_valid():
+            bookings = filter_bookings(Booking.objects.with_details(), request.query_params.dict())
+            serializer = BookingSerializer  # it has more fields that SearchBookingSerializer
+            return Response({'serializer': serializer, 'style': self.style, **self.get_page(bookings)})
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)